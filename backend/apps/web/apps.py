@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class WebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.web'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import jobs  # noqa: F401 registers the background tasks
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid='apps.web.sqlite')
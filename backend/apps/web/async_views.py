@@ -0,0 +1,231 @@
+"""
+ASGI-native variants of the hot read endpoints.
+
+DRF views are synchronous, so under an ASGI server every request to them holds
+a thread from the sync-to-async pool. These views are plain ``async def``
+Django views: authentication decodes the JWT claims without a user query,
+and every query goes through the async ORM. Payloads are produced by the same
+payload plans, serializers, pagination and renderer as the DRF views, so
+responses are identical.
+
+The stock event streams of ``apps/web/events.py`` are here too: Server-Sent
+Events as a Django view, and a WebSocket endpoint as a plain ASGI application
+that ``config/asgi.py`` routes WebSocket connections to. Browsers cannot set
+headers on either, so both also accept the access token as ``?token=``.
+"""
+import asyncio
+import functools
+import json
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import HTTP_HEADER_ENCODING, status
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .authentication import ClaimsUser, ais_current_user, has_user_claims
+from .cache import catalog_cache
+from .events import StockStream
+from .models import OrderItem, Product, PurchaseProfile
+from .pagination import ProductKeysetPagination
+from .payloads import product_plan
+from .recommendations import in_buffer_order
+from .renderers import FastJSONRenderer
+from .routers import replica_reads
+from .serializer import OrderItemSerializer
+from .watchlist import amark_watched, awatched_ids
+
+User = get_user_model()
+
+_jwt = JWTAuthentication()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    response = HttpResponse(FastJSONRenderer().render(data), status=status_code, content_type='application/json')
+    for key, value in (headers or {}).items():
+        response[key] = value
+    return response
+
+
+def unauthorized(detail):
+    return json_response({'detail': detail}, status.HTTP_401_UNAUTHORIZED,
+                         {'WWW-Authenticate': '{} realm="api"'.format(jwt_settings.AUTH_HEADER_TYPES[0])})
+
+
+def query_token_header(query_params):
+    token = query_params.get('token')
+    return '{} {}'.format(jwt_settings.AUTH_HEADER_TYPES[0], token) if token else None
+
+
+async def authenticate(request, query_token=False):
+    """
+    Async counterpart of ``StatelessJWTAuthentication.authenticate``. Token
+    validation is pure CPU work; tokens carrying user claims need no query
+    beyond the cached active check, older tokens await one user lookup.
+    Returns ``(user, None)`` or ``(None, error_response)``.
+    """
+    header = request.META.get(jwt_settings.AUTH_HEADER_NAME)
+    if header is None and query_token:
+        header = query_token_header(request.GET)
+    return await authenticate_header(header)
+
+
+async def authenticate_header(header):
+    if header is None:
+        return None, unauthorized('Authentication credentials were not provided.')
+    raw_token = _jwt.get_raw_token(header.encode(HTTP_HEADER_ENCODING))
+    if raw_token is None:
+        return None, unauthorized('Authentication credentials were not provided.')
+    try:
+        token = _jwt.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None, unauthorized('Given token not valid for any token type')
+
+    if has_user_claims(token):
+        try:
+            current = await ais_current_user(token)
+        except KeyError:
+            return None, unauthorized('User not found')
+        if not current:
+            return None, unauthorized('User is inactive or its token is out of date')
+        return ClaimsUser(token), None
+
+    try:
+        user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: token[jwt_settings.USER_ID_CLAIM]})
+    except (KeyError, User.DoesNotExist):
+        return None, unauthorized('User not found')
+    if not user.is_active:
+        return None, unauthorized('User is inactive')
+    return user, None
+
+
+def read_view(view):
+    """GET-only, JWT-authenticated async view; the view receives the DRF-wrapped request."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response({'detail': 'Method "{}" not allowed.'.format(request.method)},
+                                 status.HTTP_405_METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'})
+        user, error = await authenticate(request)
+        if error:
+            return error
+        return await view(drf_request(request, user), *args, **kwargs)
+    return wrapper
+
+
+def drf_request(request, user):
+    # Serializers and paginators expect a DRF request; wrapping is free and does not authenticate
+    wrapped = Request(request)
+    wrapped.user = user
+    return wrapped
+
+
+async def paginated(request, queryset):
+    plan = product_plan(request.user)
+    paginator = ProductKeysetPagination()
+    rows = [row async for row in paginator.page_queryset(plan.queryset(queryset), request)]
+    page = paginator.finish_page(rows)
+    return paginator.get_paginated_response(plan.render(page)).data
+
+
+@read_view
+async def product_list(request):
+    queryset = Product.objects.all() if request.user.is_staff else Product.objects.filter(quantity__gt=0)
+    with replica_reads(not await catalog_cache.arecently_written()):
+        data = await paginated(request, queryset)
+    data['results'] = await amark_watched(data['results'], request.user.id)
+    return json_response(data)
+
+
+@read_view
+async def product_detail(request, pk):
+    queryset = Product.objects.all() if request.user.is_staff else Product.objects.filter(quantity__gt=0)
+    plan = product_plan(request.user)
+    try:
+        with replica_reads(not await catalog_cache.arecently_written()):
+            row = await plan.queryset(queryset).aget(pk=pk)
+    except Product.DoesNotExist:
+        return json_response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    return json_response(plan.render([row])[0])
+
+
+@read_view
+async def watchlist(request):
+    watched = await awatched_ids(request.user.id)
+    queryset = Product.objects.filter(id__in=watched, quantity__gt=0)
+    return json_response(await paginated(request, queryset))
+
+
+@read_view
+async def recent_top_purchased_items(request):
+    ids = await PurchaseProfile.objects.filter(pk=request.user.id).values_list(
+        'recent_items', flat=True).afirst() or []
+    queryset = OrderItem.objects.select_related('product_id').filter(id__in=ids)
+    items = in_buffer_order([item async for item in queryset], ids)
+    return json_response(OrderItemSerializer(items, many=True, context={'request': request}).data)
+
+
+async def server_sent_events(events):
+    yield 'retry: 5000\n\n'
+    async for event in events:
+        if event is None:
+            yield ': keepalive\n\n'
+        else:
+            yield 'event: {}\ndata: {}\n\n'.format(event['type'], json.dumps(event))
+
+
+async def stock_events(request):
+    """Server-Sent Events stream of stock status changes on the user's watchlist."""
+    if request.method != 'GET':
+        return json_response({'detail': 'Method "{}" not allowed.'.format(request.method)},
+                             status.HTTP_405_METHOD_NOT_ALLOWED, {'Allow': 'GET'})
+    user, error = await authenticate(request, query_token=True)
+    if error:
+        return error
+    if not isinstance(request, ASGIRequest):
+        # A WSGI server would read the endless stream to its end and hold the worker forever
+        return json_response({'detail': 'Event streams are only served over ASGI.'}, status.HTTP_501_NOT_IMPLEMENTED)
+    events = StockStream(user.id).events(keepalive=settings.EVENT_STREAM_KEEPALIVE)
+    response = StreamingHttpResponse(server_sent_events(events), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx would otherwise hold events back in its buffer
+    return response
+
+
+WEBSOCKET_PATH = '/ws/stock/'
+
+
+async def websocket_application(scope, receive, send):
+    """The ``stock_events`` stream over a WebSocket, as JSON text frames. The stream is one-way."""
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    if scope['path'] != WEBSOCKET_PATH:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    header = dict(scope.get('headers', ())).get(b'authorization')
+    if header is not None:
+        header = header.decode(HTTP_HEADER_ENCODING)
+    else:
+        query = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        header = query_token_header(query)
+    user, error = await authenticate_header(header)
+    if error:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    await send({'type': 'websocket.accept'})
+
+    async def forward():
+        async for event in StockStream(user.id).events():
+            await send({'type': 'websocket.send', 'text': json.dumps(event)})
+
+    forwarding = asyncio.ensure_future(forward())
+    try:
+        while (await receive())['type'] != 'websocket.disconnect':
+            pass
+    finally:
+        forwarding.cancel()
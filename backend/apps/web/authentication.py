@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+# Claims every token carries so that read requests need no user lookup
+USER_CLAIMS = ('is_staff', 'role')
+
+
+class ShopRefreshToken(RefreshToken):
+    """Refresh token whose access tokens carry ``is_staff`` and ``role`` next to the user id."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        token['role'] = user.role
+        return token
+
+
+class ShopTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ShopRefreshToken
+
+
+class ClaimsUser(TokenUser):
+    """A user built from token claims alone. Enough for permission checks and filtering by id."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', '')
+
+
+def _state_cache_key(user_id):
+    return 'auth:state:{}'.format(user_id)
+
+
+def _state_query(user_id):
+    return User.objects.filter(id=user_id).values_list('is_active', *USER_CLAIMS)
+
+
+def _matches(state, token):
+    # state is (is_active, is_staff, role), or False for a deleted user
+    return bool(state) and state[0] and tuple(state[1:]) == tuple(token.get(claim) for claim in USER_CLAIMS)
+
+
+def is_current_user(token):
+    """
+    Whether the account behind a stateless token is still active and still has
+    the ``is_staff`` and ``role`` the token claims.
+
+    Tokens outlive deactivation and demotion, and refreshing copies the claims
+    into the next access token, so with ``JWT_ACTIVE_CACHE_TIMEOUT`` set the
+    account is looked up once and remembered for that many seconds: a user
+    deactivated or demoted by staff loses read access within the TTL, at the
+    cost of one query per user per TTL. ``None`` trusts the token until it expires.
+    """
+    timeout = settings.JWT_ACTIVE_CACHE_TIMEOUT
+    if timeout is None:
+        return True
+    user_id = token[jwt_settings.USER_ID_CLAIM]
+    state = cache.get(_state_cache_key(user_id))
+    if state is None:
+        state = _state_query(user_id).first() or False
+        cache.set(_state_cache_key(user_id), state, timeout)
+    return _matches(state, token)
+
+
+async def ais_current_user(token):
+    timeout = settings.JWT_ACTIVE_CACHE_TIMEOUT
+    if timeout is None:
+        return True
+    user_id = token[jwt_settings.USER_ID_CLAIM]
+    # The async cache API, so a network cache never blocks the event loop
+    state = await cache.aget(_state_cache_key(user_id))
+    if state is None:
+        state = await _state_query(user_id).afirst() or False
+        await cache.aset(_state_cache_key(user_id), state, timeout)
+    return _matches(state, token)
+
+
+def has_user_claims(token):
+    return all(claim in token for claim in USER_CLAIMS)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that skips the ``CustomUser`` query on read-only
+    requests. Safe-method requests with a token issued by ``ShopRefreshToken``
+    get a ``ClaimsUser``; writes, and tokens minted before the claims existed,
+    still load the full model instance.
+    """
+
+    def authenticate(self, request):
+        self.safe_request = request.method in permissions.SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if getattr(self, 'safe_request', False) and has_user_claims(validated_token):
+            try:
+                current = is_current_user(validated_token)
+            except KeyError:
+                raise AuthenticationFailed('Token contained no recognizable user identification', code='token_not_valid')
+            if not current:
+                raise AuthenticationFailed('User is inactive or its token is out of date', code='user_inactive')
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
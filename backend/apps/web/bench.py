@@ -0,0 +1,127 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Nothing here is imported by the request path. Seeding writes straight through
+``bulk_create`` and is meant for throwaway databases only.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.test.utils import (setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from django.utils import timezone
+
+from . import recommendations, sales
+from .models import Order, OrderItem, Product, WatchList
+from .search import search_backend
+
+User = get_user_model()
+
+STATUSES = ['Processing', 'Completed', 'Completed', 'Completed', 'Canceled']
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the body against a freshly migrated test database, like ``manage.py test`` does."""
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False, aliases={'default'})
+    try:
+        yield
+    finally:
+        for alias in connections:
+            connections[alias].close()
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def seed(users=100, products=1000, orders=10000, items_per_order=3, watches_per_user=5, batch_size=2000,
+         out_of_stock_ratio=0.2, seed_value=0):
+    """Bulk-insert a synthetic shop. Returns the number of rows written per model."""
+    rng = random.Random(seed_value)
+    User.objects.bulk_create(
+        [User(username='bench{}'.format(i), email='bench{}@example.com'.format(i), password='!')
+         for i in range(users)],
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+
+    catalog = []
+    for i in range(products):
+        wholesale = Decimal(rng.randint(100, 5000)) / 100
+        catalog.append(Product(
+            name='Product {}'.format(i), description='Benchmark product number {}'.format(i),
+            quantity=0 if rng.random() < out_of_stock_ratio else rng.randint(1, 500),
+            wholesale_price=wholesale, retail_price=wholesale * Decimal('1.4'),
+        ))
+    Product.objects.bulk_create(catalog, batch_size=batch_size)
+    product_rows = list(Product.objects.values_list('id', 'retail_price', 'wholesale_price'))
+
+    now = timezone.now()
+    written = 0
+    while written < orders:
+        count = min(batch_size, orders - written)
+        batch = Order.objects.bulk_create(
+            [Order(user_id_id=rng.choice(user_ids), order_status=rng.choice(STATUSES)) for _ in range(count)]
+        )
+        # auto_now_add stamps every row with "now"; spread each batch over the past year
+        # in small groups so both the timestamp and the id tiebreaker get exercised
+        for start in range(0, count, 50):
+            group = [order.id for order in batch[start:start + 50]]
+            placed = now - timedelta(minutes=(orders - written - start) * 5)
+            Order.objects.filter(id__in=group).update(data_placed=placed)
+        OrderItem.objects.bulk_create([
+            OrderItem(order_id_id=order.id, product_id_id=product_id, quantity=rng.randint(1, 3),
+                      purchase_price=retail, wholesale_price=wholesale)
+            for order in batch
+            for product_id, retail, wholesale in rng.sample(product_rows, min(items_per_order, len(product_rows)))
+        ], batch_size=batch_size)
+        written += count
+
+    WatchList.objects.bulk_create([
+        WatchList(user_id_id=user_id, product_id_id=product_id)
+        for user_id in user_ids
+        for product_id, _, _ in rng.sample(product_rows, min(watches_per_user, len(product_rows)))
+    ], batch_size=batch_size, ignore_conflicts=True)
+
+    return {'users': len(user_ids), 'products': products, 'orders': orders,
+            'order_items': orders * min(items_per_order, len(product_rows))}
+
+
+def rebuild_derived():
+    """Recompute what ``seed`` skipped by writing around the request path: sales stats, profiles, search index."""
+    with transaction.atomic():
+        sales.rebuild()
+        recommendations.rebuild()
+        search_backend().rebuild()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Millisecond p50/p95/p99/mean for a list of second-valued samples."""
+    millis = [sample * 1000 for sample in samples]
+    return {
+        'p50': percentile(millis, 0.50),
+        'p95': percentile(millis, 0.95),
+        'p99': percentile(millis, 0.99),
+        'mean': statistics.mean(millis),
+    }
+
+
+def time_callable(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
@@ -0,0 +1,454 @@
+"""
+The API benchmark behind ``manage.py bench_api``.
+
+Every named route in ``config/urls.py`` has a scenario here with a weight
+that approximates production traffic. Most of it is customers browsing the
+catalog and their orders, with a trickle of checkouts and rare staff reports
+and imports. ``run`` drives the mix through an in-process ``APIClient``
+against the configured database with real JWT credentials. It measures the
+whole Django stack (middleware, authentication, queries, serializers and
+rendering) but not the network or the server; ``manage.py loadtest`` covers
+those.
+
+A scenario's ``prepare`` sets up whatever its request needs through the ORM
+and returns the request as a callable. Only that callable is timed and has
+its queries counted.
+"""
+import csv
+import io
+import itertools
+import random
+import re
+import time
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from rest_framework.test import APIClient
+
+from . import reservations
+from .authentication import ShopRefreshToken
+from .bench import summarize
+from .checkout import place_order
+from .models import Order, Product, WatchList
+from .ratelimit import bucket_store
+
+User = get_user_model()
+
+LOGIN_USERNAME = 'bench-login'
+LOGIN_PASSWORD = 'correct horse battery staple'
+
+Scenario = namedtuple('Scenario', 'name weight ok prepare')
+SCENARIOS = []
+
+
+def scenario(name, weight, ok=(200,)):
+    """Register ``prepare`` as the traffic for URL name ``name``; ``ok`` lists the expected status codes."""
+    def register(prepare):
+        SCENARIOS.append(Scenario(name, weight, ok, prepare))
+        return prepare
+    return register
+
+
+def route_names():
+    """The URL names of every top-level route (Django's admin is an include), which the scenarios must cover."""
+    return {pattern.name for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name}
+
+
+def consume(response):
+    # A streaming response does its work while it is read
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+class Traffic:
+    """The users and objects the scenarios pick from, all on a seeded random stream."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.customers = [user for user in User.objects.filter(is_staff=False).order_by('id')
+                          if re.match(r'^bench\d+$', user.username)]
+        if not self.customers:
+            raise ValueError('No bench users found; run manage.py seed_bench first')
+        self.staff, _ = User.objects.get_or_create(username='bench-staff', defaults={
+            'email': 'bench-staff@example.com', 'is_staff': True})
+        self.login_user = User.objects.filter(username=LOGIN_USERNAME).first()
+        if self.login_user is None:
+            self.login_user = User.objects.create_user(LOGIN_USERNAME, 'bench-login@example.com', LOGIN_PASSWORD)
+        self.product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        self.sequence = itertools.count()
+        self.clients = {}
+
+    def client(self, user=None):
+        """An ``APIClient`` that sends ``user``'s access token; no token when ``user`` is None."""
+        key = user.id if user else None
+        if key not in self.clients:
+            client = self.clients[key] = APIClient()
+            if user:
+                client.credentials(HTTP_AUTHORIZATION='Bearer {}'.format(ShopRefreshToken.for_user(user).access_token))
+        return self.clients[key]
+
+    def customer(self):
+        return self.rng.choice(self.customers)
+
+    def product_id(self):
+        return self.rng.choice(self.product_ids)
+
+    def in_stock_product_id(self):
+        return self.rng.choice(list(Product.objects.filter(quantity__gt=0).values_list('id', flat=True)))
+
+    def open_order(self, user):
+        return place_order(user, [{'product_id': self.in_stock_product_id(), 'quantity': 1}])
+
+    def order_id(self, user):
+        order_id = Order.objects.filter(user_id=user.id).values_list('id', flat=True).first()
+        return order_id or self.open_order(user).id
+
+    def unique(self, prefix):
+        return '{}-{}-{}'.format(prefix, int(time.time()), next(self.sequence))
+
+
+# Customer reads: the bulk of the traffic
+
+@scenario('product_list', 20)
+def product_list(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('product_list'), {'page_size': 20})
+
+
+@scenario('product_detail', 10)
+def product_detail(t):
+    client, url = t.client(t.customer()), reverse('product_detail', args=[t.in_stock_product_id()])
+    return lambda: client.get(url)
+
+
+@scenario('product_search', 6)
+def product_search(t):
+    client, query = t.client(t.customer()), 'product {}'.format(t.rng.randrange(100))
+    return lambda: client.get(reverse('product_search'), {'q': query})
+
+
+@scenario('user_orders', 8)
+def user_orders(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('user_orders'))
+
+
+@scenario('order_detail', 4)
+def order_detail(t):
+    user = t.customer()
+    client, url = t.client(user), reverse('order_detail', args=[t.order_id(user)])
+    return lambda: client.get(url)
+
+
+@scenario('watchlist', 6)
+def watchlist(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('watchlist'))
+
+
+@scenario('top_frequently_purchased', 4)
+def top_frequently_purchased(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('top_frequently_purchased'))
+
+
+@scenario('recent_top_purchased_items', 4)
+def recent_top_purchased_items(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('recent_top_purchased_items'))
+
+
+@scenario('async_product_list', 4)
+def async_product_list(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('async_product_list'), {'page_size': 20})
+
+
+@scenario('async_product_detail', 2)
+def async_product_detail(t):
+    client, url = t.client(t.customer()), reverse('async_product_detail', args=[t.in_stock_product_id()])
+    return lambda: client.get(url)
+
+
+@scenario('async_watchlist', 2)
+def async_watchlist(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('async_watchlist'))
+
+
+@scenario('async_recent_top_purchased_items', 2)
+def async_recent_top_purchased_items(t):
+    client = t.client(t.customer())
+    return lambda: client.get(reverse('async_recent_top_purchased_items'))
+
+
+@scenario('stock_events', 0.5, ok=(401,))
+def stock_events(t):
+    # An accepted stream never ends, so only the handshake's token check is measured
+    client = t.client()
+    return lambda: client.get(reverse('stock_events'))
+
+
+@scenario('order_export', 0.5)
+def order_export(t):
+    client = t.client(t.customer())
+    return lambda: consume(client.get(reverse('order_export'), {'type': 'ndjson'}))
+
+
+# Customer writes
+
+@scenario('purchase', 4, ok=(201,))
+def purchase(t):
+    client, items = t.client(t.customer()), [{'product_id': t.in_stock_product_id(), 'quantity': 1}]
+    return lambda: client.post(reverse('purchase'), {'items': items}, format='json')
+
+
+@scenario('reservations', 1.5, ok=(201,))
+def reserve(t):
+    client, items = t.client(t.customer()), [{'product_id': t.in_stock_product_id(), 'quantity': 1}]
+    return lambda: client.post(reverse('reservations'), {'items': items}, format='json')
+
+
+@scenario('release_reservation', 1, ok=(204,))
+def release_reservation(t):
+    user = t.customer()
+    held = reservations.hold(user, [{'product_id': t.in_stock_product_id(), 'quantity': 1}])
+    client, url = t.client(user), reverse('release_reservation', args=[held[0].id])
+    return lambda: client.delete(url)
+
+
+@scenario('cancel', 1)
+def cancel(t):
+    user = t.customer()
+    client, url = t.client(user), reverse('cancel', args=[t.open_order(user).id])
+    return lambda: client.patch(url)
+
+
+@scenario('add_watchlist', 2, ok=(201,))
+def add_watchlist(t):
+    user, product_id = t.customer(), t.product_id()
+    WatchList.objects.filter(user_id=user.id, product_id=product_id).delete()
+    client = t.client(user)
+    return lambda: client.post(reverse('add_watchlist'), {'product_id': product_id}, format='json')
+
+
+@scenario('remove_watchlist', 2, ok=(204,))
+def remove_watchlist(t):
+    user, product_id = t.customer(), t.product_id()
+    WatchList.objects.get_or_create(user_id=user, product_id_id=product_id)
+    client, url = t.client(user), reverse('remove_watchlist', args=[product_id])
+    return lambda: client.delete(url)
+
+
+@scenario('bulk_add_watchlist', 1, ok=(204,))
+def bulk_add_watchlist(t):
+    user, product_ids = t.customer(), [t.product_id() for _ in range(10)]
+    client = t.client(user)
+    return lambda: client.post(reverse('bulk_add_watchlist'), {'product_ids': product_ids}, format='json')
+
+
+@scenario('bulk_remove_watchlist', 1)
+def bulk_remove_watchlist(t):
+    user, product_ids = t.customer(), [t.product_id() for _ in range(10)]
+    client = t.client(user)
+    return lambda: client.post(reverse('bulk_remove_watchlist'), {'product_ids': product_ids}, format='json')
+
+
+# Accounts
+
+@scenario('register', 0.3, ok=(201,))
+def register(t):
+    client, username = t.client(), t.unique('bench-new')
+    data = {'username': username, 'email': '{}@example.com'.format(username), 'password': LOGIN_PASSWORD}
+    return lambda: client.post(reverse('register'), data, format='json')
+
+
+@scenario('login', 0.3)
+def login(t):
+    client = t.client()
+    return lambda: client.post(reverse('login'), {'username': LOGIN_USERNAME, 'password': LOGIN_PASSWORD},
+                               format='json')
+
+
+@scenario('token_obtain_pair', 0.2)
+def token_obtain_pair(t):
+    client = t.client()
+    return lambda: client.post(reverse('token_obtain_pair'),
+                               {'username': LOGIN_USERNAME, 'password': LOGIN_PASSWORD}, format='json')
+
+
+@scenario('token_refresh', 0.3)
+def token_refresh(t):
+    client, refresh = t.client(), str(ShopRefreshToken.for_user(t.customer()))
+    return lambda: client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+
+
+# Staff
+
+@scenario('dashboard_orders', 1)
+def dashboard_orders(t):
+    client = t.client(t.staff)
+    return lambda: client.get(reverse('dashboard_orders'))
+
+
+@scenario('update_order_status', 1)
+def update_order_status(t):
+    client, url = t.client(t.staff), reverse('update_order_status', args=[t.open_order(t.customer()).id])
+    return lambda: client.patch(url, {'order_status': 'Completed'}, format='json')
+
+
+@scenario('most_profitable_product', 0.5)
+def most_profitable_product(t):
+    client = t.client(t.staff)
+    return lambda: client.get(reverse('most_profitable_product'))
+
+
+@scenario('top-sold-products', 0.5)
+def top_sold_products(t):
+    client = t.client(t.staff)
+    return lambda: client.get(reverse('top-sold-products'))
+
+
+@scenario('total-items-sold', 0.5)
+def total_items_sold(t):
+    client = t.client(t.staff)
+    return lambda: client.get(reverse('total-items-sold'))
+
+
+@scenario('add_product', 0.3, ok=(201,))
+def add_product(t):
+    client, name = t.client(t.staff), t.unique('Bench product')
+    data = {'name': name, 'description': 'Added by the benchmark', 'quantity': 10,
+            'retail_price': '14.00', 'wholesale_price': '10.00'}
+    return lambda: client.post(reverse('add_product'), data, format='json')
+
+
+@scenario('product-detail', 0.5)
+def edit_product(t):
+    client, url = t.client(t.staff), reverse('product-detail', args=[t.product_id()])
+    return lambda: client.patch(url, {'description': t.unique('Edited by the benchmark')}, format='json')
+
+
+@scenario('product_import', 0.2)
+def product_import(t):
+    fields = ['id', 'name', 'description', 'quantity', 'retail_price', 'wholesale_price']
+    feed = io.StringIO()
+    writer = csv.writer(feed)
+    writer.writerow(fields)
+    writer.writerows(Product.objects.filter(
+        id__in=t.rng.sample(t.product_ids, min(20, len(t.product_ids)))).values_list(*fields))
+    client, body = t.client(t.staff), feed.getvalue().encode('utf-8')
+    return lambda: client.post(reverse('product_import'), body, content_type='text/csv')
+
+
+@scenario('product_export', 0.2)
+def product_export(t):
+    client = t.client(t.staff)
+    return lambda: consume(client.get(reverse('product_export'), {'type': 'csv'}))
+
+
+@scenario('metrics', 0.2)
+def metrics(t):
+    client = t.client(t.staff)
+    return lambda: client.get(reverse('metrics'))
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def schedule(requests, min_per_route, rng):
+    """Each scenario's share of ``requests`` by weight, but at least ``min_per_route``, shuffled."""
+    total_weight = sum(s.weight for s in SCENARIOS)
+    plan = []
+    for s in SCENARIOS:
+        plan += [s] * max(min_per_route, int(round(requests * s.weight / total_weight)))
+    rng.shuffle(plan)
+    return plan
+
+
+# Login attempts would soon be throttled, which is not what the benchmark measures
+@override_settings(LOGIN_RATE_LIMITS={'ip': (10 ** 9, 1), 'username': (10 ** 9, 1)})
+def run(requests=2000, warmup=2, min_per_route=5, seed_value=0):
+    """
+    Drive the traffic mix and return per-route results: request and error counts,
+    requests per second of one client, latency percentiles in ms and mean queries.
+    """
+    bucket_store.cache_clear()
+    rng = random.Random(seed_value)
+    traffic = Traffic(rng)
+    for s in SCENARIOS:
+        for _ in range(warmup):
+            s.prepare(traffic)()
+
+    samples = {s.name: [] for s in SCENARIOS}
+    queries = {s.name: 0 for s in SCENARIOS}
+    errors = {s.name: [] for s in SCENARIOS}
+    counter = QueryCounter()
+    wrappers = [connections[alias].execute_wrapper(counter) for alias in connections]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        for s in schedule(requests, min_per_route, rng):
+            request = s.prepare(traffic)
+            before = counter.count
+            started = time.perf_counter()
+            response = request()
+            samples[s.name].append(time.perf_counter() - started)
+            queries[s.name] += counter.count - before
+            if response.status_code not in s.ok:
+                errors[s.name].append(response.status_code)
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+    results = {}
+    for name, timings in samples.items():
+        summary = summarize(timings)
+        results[name] = {
+            'requests': len(timings),
+            'errors': len(errors[name]),
+            'error_statuses': sorted(set(errors[name])),
+            'rps': round(len(timings) / sum(timings), 1),
+            'p50': round(summary['p50'], 3),
+            'p95': round(summary['p95'], 3),
+            'p99': round(summary['p99'], 3),
+            'queries': round(queries[name] / len(timings), 2),
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, query_tolerance=0.1, latency=True):
+    """
+    List the regressions of ``results`` against a saved ``baseline``: any
+    errors, a p50 or p95 more than ``tolerance`` slower, or more than
+    ``query_tolerance`` more queries per request.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if result['errors']:
+            regressions.append('{}: {} unexpected response(s) {}'.format(
+                name, result['errors'], result['error_statuses']))
+    for name, base in sorted(baseline['routes'].items()):
+        result = results.get(name)
+        if result is None:
+            regressions.append('{}: in the baseline but no longer benchmarked'.format(name))
+            continue
+        if result['queries'] > base['queries'] * (1 + query_tolerance):
+            regressions.append('{}: {} queries per request, baseline {}'.format(name, result['queries'],
+                                                                                base['queries']))
+        if latency:
+            for key in ('p50', 'p95'):
+                if result[key] > base[key] * (1 + tolerance):
+                    regressions.append('{}: {} {:.2f} ms, baseline {:.2f} ms'.format(name, key, result[key], base[key]))
+    return regressions
@@ -0,0 +1,98 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def audience_for(user):
+    # ProductSerializer hides stock and wholesale price from customers, so the
+    # two audiences must never share an entry
+    return 'staff' if user.is_staff else 'customer'
+
+
+class CatalogCache:
+    """
+    Versioned cache for serialized catalog payloads.
+
+    Entries are never deleted on write. Instead every key embeds a version
+    number, and a write bumps the version of each product it touched plus the
+    version of the list snapshots, so stale entries simply stop being read and
+    age out of the backend. Any Django cache backend works: the default is the
+    in-process LRU ``LocMemCache``, and ``RedisCache`` is used when
+    ``CATALOG_CACHE_URL`` is set.
+
+    Each entry is a ``(payload, last_modified)`` pair, so a conditional request
+    that hits the cache is validated without a query, see conditional.py.
+    """
+    list_version_key = 'catalog:list-version'
+    product_version_key = 'catalog:product-version:{}'
+    written_key = 'catalog:written'
+
+    @property
+    def backend(self):
+        return caches[settings.CATALOG_CACHE_ALIAS]
+
+    @property
+    def timeout(self):
+        return settings.CATALOG_CACHE_TIMEOUT
+
+    def _version(self, key):
+        version = self.backend.get(key)
+        if version is None:
+            # Seed with a clock value rather than 1: if the counter was evicted,
+            # restarting at 1 could resurrect entries written under old versions
+            self.backend.add(key, time.time_ns(), None)
+            version = self.backend.get(key)
+        return version
+
+    def _bump(self, key):
+        try:
+            self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, time.time_ns(), None)
+
+    # A key embeds the version current when it was built. Resolve it once per request and
+    # use it for both the get and the set: a fill keyed afresh could land under the version
+    # a concurrent write just bumped to, and outlive that write.
+    # The "2" keeps these pairs apart from the bare payloads older processes stored
+    def product_key(self, product_id, audience):
+        version = self._version(self.product_version_key.format(product_id))
+        return 'catalog:product2:{}:{}:{}'.format(audience, product_id, version)
+
+    def list_key(self, url, audience):
+        digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+        return 'catalog:list2:{}:{}:{}'.format(audience, self._version(self.list_version_key), digest)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, data, last_modified):
+        self.backend.set(key, (data, last_modified), self.timeout)
+
+    def invalidate(self, product_ids):
+        for product_id in set(product_ids):
+            self._bump(self.product_version_key.format(product_id))
+        self._bump(self.list_version_key)
+        if settings.DATABASE_READ_REPLICA:
+            self.backend.set(self.written_key, True, settings.DATABASE_REPLICA_LAG)
+
+    def recently_written(self):
+        # A miss filled from a replica that has not caught up would cache the old rows
+        # under the new version, so fill from the primary until the replica is current
+        return bool(settings.DATABASE_READ_REPLICA) and self.backend.get(self.written_key) is not None
+
+    async def arecently_written(self):
+        return bool(settings.DATABASE_READ_REPLICA) and await self.backend.aget(self.written_key) is not None
+
+    def invalidate_on_commit(self, product_ids):
+        # Bumping before commit would let a concurrent reader re-cache the old row
+        product_ids = list(product_ids)
+        transaction.on_commit(lambda: self.invalidate(product_ids))
+
+    def clear(self):
+        self.backend.clear()
+
+
+catalog_cache = CatalogCache()
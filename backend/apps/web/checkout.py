@@ -0,0 +1,118 @@
+from collections import OrderedDict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import inventory
+from .exceptions import NotEnoughInventoryException, OrderStatusConflictException, ValidationException
+from .models import Order, OrderItem, Product
+from .recommendations import forget_order, record_order
+from .sales import CANCELED, PROCESSING, apply_totals, line_totals, move_order
+from .sqlite import immediate_atomic
+
+
+def normalize_cart(items):
+    # Collapse duplicate lines so every product is locked and decremented once
+    cart = OrderedDict()
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'items': 'Each item needs an integer product_id and quantity.'})
+        if quantity <= 0:
+            raise ValidationError({'items': 'Quantity must be positive for product_id {}'.format(product_id)})
+        cart[product_id] = cart.get(product_id, 0) + quantity
+    return cart
+
+
+def place_order(user, items):
+    """
+    Create an order for ``items`` in a constant number of queries.
+
+    Products are locked in ascending id order so two checkouts sharing products
+    always acquire their row locks in the same sequence and cannot deadlock. The
+    stock decrement is a single conditional UPDATE, so even a backend without
+    row locks (SQLite) can never drive a quantity below zero. Sharded products
+    are not locked at all: every checkout would queue on their one row again,
+    and the shard decrements in ``inventory.take`` already guard their stock.
+    """
+    cart = normalize_cart(items)
+    if not cart:
+        raise ValidationError({'items': 'The cart is empty.'})
+
+    with immediate_atomic():
+        products = list(
+            Product.objects.select_for_update().filter(id__in=cart.keys(), shard_count=0).order_by('id')
+        )
+        if len(products) != len(cart):
+            # The rest are sharded, or missing
+            products = sorted(products + list(Product.objects.filter(
+                id__in=cart.keys() - {product.id for product in products})), key=lambda product: product.id)
+        if len(products) != len(cart):
+            raise Product.DoesNotExist('Product does not exist')
+
+        for product in products:
+            # A sharded product's quantity is only a mirror, its shards are checked in take()
+            if not product.shard_count and cart[product.id] > product.quantity:
+                raise NotEnoughInventoryException('Not enough stock for product_id {}'.format(product.id))
+
+        inventory.take(cart, {product.id: product.shard_count for product in products if product.shard_count})
+        order = create_order(user, products, cart)
+    return order
+
+
+def create_order(user, products, cart):
+    """Write the order, its items and the derived stats for stock that has already been taken."""
+    order = Order.objects.create(user_id=user, order_status=PROCESSING)
+    items = OrderItem.objects.bulk_create([
+        OrderItem(order_id=order, product_id=product, quantity=cart[product.id],
+                  purchase_price=product.retail_price, wholesale_price=product.wholesale_price)
+        for product in products
+    ])
+    record_order(order.user_id_id, items)
+    apply_totals(line_totals((product.id, cart[product.id], product.retail_price, product.wholesale_price)
+                             for product in products), PROCESSING)
+    return order
+
+
+def restore_stock(order):
+    """
+    Put an order's items back on the shelf with one UPDATE, however many lines
+    or products it has. Returns the per-product sales totals that were reversed.
+    """
+    totals = line_totals(OrderItem.objects.filter(order_id=order).values_list(
+        'product_id', 'quantity', 'purchase_price', 'wholesale_price'))
+    if totals:
+        inventory.give_back({product_id: units for product_id, (units, _, _) in totals.items()},
+                            inventory.shard_counts(totals.keys()))
+    return totals
+
+
+def change_order_status(order, new_status):
+    """
+    Move ``order`` to ``new_status`` and keep stock and sales stats in step.
+
+    The status write is a compare-and-set against the status the caller read,
+    so of two racing requests (cancel vs. complete, or a double cancel) only
+    the first one to commit takes effect and stock is restored at most once.
+    Callers should lock the order with ``select_for_update`` where supported.
+    """
+    old_status = order.order_status
+    if old_status == CANCELED and new_status != CANCELED:
+        raise ValidationException('Canceled orders cannot be reopened.')
+
+    with transaction.atomic():
+        updated = Order.objects.filter(id=order.id, order_status=old_status).update(
+            order_status=new_status, updated_at=timezone.now())
+        if not updated:
+            raise OrderStatusConflictException()
+
+        totals = None
+        if new_status == CANCELED and old_status != CANCELED:
+            totals = restore_stock(order)
+            forget_order(order)
+        move_order(order, old_status, new_status, totals)
+    order.order_status = new_status
+    return order
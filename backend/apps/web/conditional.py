@@ -0,0 +1,53 @@
+"""
+HTTP conditional requests for the catalog and order reads.
+
+The validators come from ``Product.updated_at`` and ``Order.updated_at``,
+never from the payload, so they cost no serialization. The ETag is a digest
+of whatever the response was built from: audience, ids and timestamps. The
+Last-Modified date is the newest of those timestamps. A client that sends
+``If-None-Match`` or ``If-Modified-Since`` and is still current gets a 304
+after at most one indexed query. When the catalog cache holds the validators
+next to the payload, no query runs at all.
+
+Customer catalog responses carry ``CATALOG_CACHE_CONTROL``. Everything else
+is ``private, no-cache``: it may be stored, but must be revalidated.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+PRIVATE = 'private, no-cache'
+
+
+def etag(*parts):
+    return '"{}"'.format(hashlib.md5(repr(parts).encode('utf-8')).hexdigest())
+
+
+def catalog_cache_control(user):
+    # Staff see stock and wholesale prices, which must stay out of shared caches
+    return PRIVATE if user.is_staff else settings.CATALOG_CACHE_CONTROL
+
+
+def respond(request, tag, last_modified, build, cache_control=PRIVATE):
+    """
+    A 304 when the request's validators still match ``tag`` and ``last_modified``,
+    else ``build()``; either way with the validator and caching headers set.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    if timestamp is not None and time.time() < timestamp + 1:
+        # HTTP dates have whole seconds, so a write later in this same second would keep
+        # the date. Until the second is over, offer no date and let the ETag decide
+        timestamp = None
+    response = get_conditional_response(request, etag=tag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    response['ETag'] = tag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = cache_control
+    # Who asks decides the audience and the is_watched flags
+    patch_vary_headers(response, ['Authorization'])
+    return response
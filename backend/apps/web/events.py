@@ -0,0 +1,200 @@
+"""
+Stock change events for watchlist subscribers.
+
+Every change to a product's stock goes through ``apps/web/inventory.py``,
+which calls ``stock_changed_on_commit``. Once the transaction commits, the
+products' new stock status (in stock, low stock or out of stock) is
+published to the broker as ``stock_changed`` events. Adding or removing a
+watchlist entry publishes ``watchlist_changed`` for that user.
+
+Clients subscribe over Server-Sent Events (``/events/stock/``) or a WebSocket
+(``/ws/stock/``), both served by ASGI only, see ``async_views``. A
+``StockStream`` first sends the status of every product on the user's
+watchlist. After that it sends an event only when one of those products
+changes status, so clients no longer need to poll ``/watchlist/``.
+
+The default broker lives in process memory and reaches only the streams
+served by the same process. It publishes nothing, and runs no query, while
+nobody is subscribed. With several server processes, or with stock changed
+by the worker, set ``EVENT_BROKER_URL=redis://...`` (needs ``pip install
+redis``).
+"""
+import asyncio
+import functools
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .models import Product, WatchList
+
+STOCK_CHANGED = 'stock_changed'
+WATCHLIST_CHANGED = 'watchlist_changed'
+
+
+class MemoryBroker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+
+    def active(self):
+        return bool(self.subscribers)
+
+    def publish(self, events):
+        # Publishers are sync code on any thread, subscribers live on event loops
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for loop, queue in subscribers:
+            for event in events:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """An ``asyncio.Queue`` receiving every event published while the block runs."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self.lock:
+            self.subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self.lock:
+                self.subscribers.discard(subscriber)
+
+
+class RedisBroker:
+    channel = 'events:stock'
+
+    def __init__(self, url, client=None, connect=None):
+        """``client`` publishes; ``connect()`` opens an asyncio client per subscription. Both default to redis-py."""
+        if client is None or connect is None:
+            try:
+                import redis
+                import redis.asyncio
+            except ImportError:
+                raise ImproperlyConfigured('EVENT_BROKER_URL points at Redis but the redis package is not installed')
+            client = client or redis.Redis.from_url(url)
+            connect = connect or functools.partial(redis.asyncio.Redis.from_url, url)
+        self.client = client
+        self.connect = connect
+
+    def active(self):
+        return True  # subscribers may be in any process
+
+    def publish(self, events):
+        self.client.publish(self.channel, json.dumps(events))
+
+    @asynccontextmanager
+    async def subscribe(self):
+        client = self.connect()
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.channel)
+        queue = asyncio.Queue()
+
+        async def pump():
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    for event in json.loads(message['data']):
+                        queue.put_nowait(event)
+
+        pumping = asyncio.ensure_future(pump())
+        try:
+            yield queue
+        finally:
+            pumping.cancel()
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.close()
+            await client.close()
+
+
+@functools.lru_cache(maxsize=None)
+def broker():
+    location = settings.EVENT_BROKER_URL
+    if location.split('://', 1)[0] in ('redis', 'rediss', 'unix'):
+        return RedisBroker(location)
+    return MemoryBroker()
+
+
+def stock_status(quantity):
+    if quantity <= 0:
+        return 'out_of_stock'
+    return 'low_stock' if quantity <= settings.LOW_STOCK_THRESHOLD else 'in_stock'
+
+
+def stock_event(product_id, quantity):
+    return {'type': STOCK_CHANGED, 'product_id': product_id, 'status': stock_status(quantity)}
+
+
+def publish_stock(product_ids):
+    events_broker = broker()
+    if not events_broker.active():
+        return
+    rows = Product.objects.filter(id__in=product_ids).values_list('id', 'quantity')
+    events_broker.publish([stock_event(product_id, quantity) for product_id, quantity in rows])
+
+
+def stock_changed_on_commit(product_ids):
+    """Announce the stock of ``product_ids`` (ids or an ``id`` values queryset) once the transaction commits."""
+    if not isinstance(product_ids, QuerySet):
+        product_ids = list(product_ids)
+    # Delivery is best effort: the write has committed, so a broker outage is logged rather than
+    # failing the request, whose retry could then repeat the write
+    transaction.on_commit(lambda: publish_stock(product_ids), robust=True)
+
+
+def watchlist_changed_on_commit(user_id):
+    transaction.on_commit(lambda: broker().publish([{'type': WATCHLIST_CHANGED, 'user_id': user_id}]), robust=True)
+
+
+class StockStream:
+    """One subscriber's view of the events: stock status changes of the products it watches."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.watched = set()
+        self.sent = {}  # product_id -> the status the client last got
+
+    async def _watchlist(self):
+        return {product_id async for product_id in WatchList.objects.filter(
+            user_id=self.user_id).values_list('product_id', flat=True)}
+
+    async def _snapshot(self, product_ids):
+        return [stock_event(product_id, quantity) async for product_id, quantity in Product.objects.filter(
+            id__in=product_ids).order_by('id').values_list('id', 'quantity')]
+
+    def _fresh(self, event):
+        if event['product_id'] not in self.watched or self.sent.get(event['product_id']) == event['status']:
+            return False
+        self.sent[event['product_id']] = event['status']
+        return True
+
+    async def events(self, keepalive=None):
+        """
+        Yield events for the client, forever. With ``keepalive`` set, yield None
+        after that many idle seconds so the transport can send a heartbeat.
+        """
+        # Subscribe before reading the snapshot so no change falls in between
+        async with broker().subscribe() as queue:
+            self.watched = await self._watchlist()
+            for event in await self._snapshot(self.watched):
+                if self._fresh(event):
+                    yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event['type'] == WATCHLIST_CHANGED and event['user_id'] == self.user_id:
+                    watched = await self._watchlist()
+                    added, self.watched = watched - self.watched, watched
+                    for product_id in set(self.sent) - watched:
+                        del self.sent[product_id]
+                    for event in await self._snapshot(added):
+                        if self._fresh(event):
+                            yield event
+                elif event['type'] == STOCK_CHANGED and self._fresh(event):
+                    yield event
@@ -19,6 +19,26 @@ class ValidationException(APIException):
     default_detail = 'Completed orders cannot be canceled'
 
 
+class OrderStatusConflictException(APIException):
+    status_code = 409
+    default_detail = 'The order was updated by another request, please reload it and try again'
+
+
+class ReservationExpiredException(APIException):
+    status_code = 410
+    default_detail = 'The reservation has expired or was already used, please reserve the items again'
+
+
+class IdempotencyConflictException(APIException):
+    status_code = 409
+    default_detail = 'A request with this Idempotency-Key is still being processed, please retry shortly'
+
+
+class IdempotencyKeyReusedException(APIException):
+    status_code = 422
+    default_detail = 'This Idempotency-Key was already used for a different request'
+
+
 def custom_exception_handler(exc, context):
     response = exception_handler(exc, context)
     if isinstance(exc, InvalidCredentialsException):
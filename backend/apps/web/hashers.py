@@ -0,0 +1,27 @@
+"""
+Password hashers with costs taken from settings.
+
+Django re-hashes a password on the next successful login whenever its stored
+hash was made by a hasher other than the first in ``PASSWORD_HASHERS`` or with
+different costs, so switching algorithm or retuning only needs a settings
+change: existing users are migrated as they log in.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (Argon2PasswordHasher, BCryptSHA256PasswordHasher,
+                                         PBKDF2PasswordHasher)
+
+_argon2 = getattr(settings, 'PASSWORD_ARGON2_COSTS', {})
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = _argon2.get('time_cost', Argon2PasswordHasher.time_cost)
+    memory_cost = _argon2.get('memory_cost', Argon2PasswordHasher.memory_cost)
+    parallelism = _argon2.get('parallelism', Argon2PasswordHasher.parallelism)
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    rounds = getattr(settings, 'PASSWORD_BCRYPT_ROUNDS', BCryptSHA256PasswordHasher.rounds)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
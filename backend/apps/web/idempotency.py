@@ -0,0 +1,140 @@
+"""
+``Idempotency-Key`` support for the order mutation endpoints.
+
+A client that times out on ``POST /purchase/`` cannot tell whether its order
+was placed. If the retry carries the same ``Idempotency-Key`` header, the
+server answers with the response of the first attempt instead of running it
+again. Keys are scoped to the user and remembered for ``IDEMPOTENCY_KEY_TTL``
+seconds. The first attempt claims its key by committing an ``IdempotencyKey``
+row before doing any work, so a duplicate that arrives while it runs waits
+for the outcome instead of placing a second order. The response is stored in
+the same transaction as the handler's writes: a request that dies before
+that commits leaves neither behind, so the retry that takes over its claim
+runs it afresh. Finished responses are also kept in the cache, so most
+replays are answered without a query.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .exceptions import IdempotencyConflictException, IdempotencyKeyReusedException
+from .models import IdempotencyKey
+from .sqlite import immediate_atomic
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def _cache_key(user_id, key):
+    return 'idempotency:{}:{}'.format(user_id, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def fingerprint(request):
+    # The same key sent with another endpoint or payload is a client bug, not a retry
+    payload = json.dumps(request.data, cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256('{} {}\n{}'.format(request.method, request.path, payload).encode('utf-8')).hexdigest()
+
+
+def claim(user_id, key, digest):
+    """
+    Take ``key`` for a new request. Returns None once the caller owns it, or
+    the ``(fingerprint, status_code, data)`` of the request that got there first.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(user_id_id=user_id, key=key, fingerprint=digest,
+                                              expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL))
+            return None
+        except IntegrityError:
+            pass
+
+        row = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+        if row is None:
+            continue  # the owner failed and let go of the key
+        if row.expires_at <= now or (row.status_code is None and row.created_at <= now - timedelta(
+                seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)):
+            # Forgotten, or its request died without answering; delete it unless someone else already has
+            IdempotencyKey.objects.filter(pk=row.pk, created_at=row.created_at).delete()
+            continue
+        if row.fingerprint != digest:
+            raise IdempotencyKeyReusedException()
+        if row.status_code is not None:
+            return row.fingerprint, row.status_code, row.response
+        if time.monotonic() >= deadline:
+            raise IdempotencyConflictException()
+        time.sleep(POLL_INTERVAL)
+
+
+def remember(user_id, key, digest, response):
+    """Store the owner's response for replays, or give the key up after a server error."""
+    owned = IdempotencyKey.objects.filter(user_id=user_id, key=key, fingerprint=digest, status_code__isnull=True)
+    if response.status_code >= 500:
+        owned.delete()
+        return
+    # Round-trip through JSON so a replay from the cache and one from the table look the same
+    data = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    owned.update(status_code=response.status_code, response=data)
+    transaction.on_commit(lambda: cache().set(_cache_key(user_id, key), (digest, response.status_code, data),
+                                              settings.IDEMPOTENCY_KEY_TTL))
+
+
+def replay(stored, digest):
+    stored_digest, status_code, data = stored
+    if stored_digest != digest:
+        raise IdempotencyKeyReusedException()
+    return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(handler):
+    """
+    Make an ``APIView`` handler honour the ``Idempotency-Key`` header. Put it
+    outside ``transaction.atomic`` so the claim is visible to duplicates while
+    the handler runs; requests without the header are not affected.
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'error': 'Idempotency-Key must be 1 to {} characters'.format(MAX_KEY_LENGTH)},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        user_id = request.user.id
+        digest = fingerprint(request)
+        stored = cache().get(_cache_key(user_id, key)) or claim(user_id, key, digest)
+        if stored is not None:
+            return replay(stored, digest)
+        try:
+            with immediate_atomic():
+                response = handler(view, request, *args, **kwargs)
+                remember(user_id, key, digest, response)
+        except BaseException:
+            # Raised errors are answered afresh, a retry may well succeed
+            IdempotencyKey.objects.filter(user_id=user_id, key=key, status_code__isnull=True).delete()
+            raise
+        return response
+    return wrapper
+
+
+def purge_expired(now=None):
+    """Delete stored responses past their TTL. Returns how many were removed."""
+    return IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
@@ -0,0 +1,141 @@
+"""
+Stock taking and returning, with an optional sharded-counter mode for hot products.
+
+A plain product keeps its stock in ``Product.quantity`` and is decremented
+with one conditional UPDATE per cart. Under a flash sale every buyer queues on
+that one row, so a product can instead be split into ``shard_count``
+``StockShard`` rows: each take decrements one randomly chosen shard, spreading
+the row locks, and ``Product.quantity`` becomes a mirror of the shard total
+refreshed by ``sync_sharded`` (the worker runs it every few seconds). The
+catalog may show a sharded product's stock slightly late, but it can never be
+oversold because only the shards are ever checked.
+
+Every change to stock goes through this module, which announces it to the
+watchlist event streams (see ``events.py``) once the transaction commits.
+"""
+import random
+from functools import reduce
+import operator
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.utils import timezone
+
+from . import events
+from .cache import catalog_cache
+from .exceptions import NotEnoughInventoryException
+from .models import Product, StockShard
+
+
+def shard_counts(product_ids):
+    return dict(Product.objects.filter(id__in=product_ids, shard_count__gt=0).values_list('id', 'shard_count'))
+
+
+def take(cart, sharded=None):
+    """
+    Remove ``{product_id: quantity}`` from stock, all or nothing; call inside a
+    transaction. ``sharded`` maps the cart's sharded products to their shard
+    count. Raises ``NotEnoughInventoryException`` when any line cannot be covered.
+    """
+    sharded = sharded or {}
+    plain = {pid: qty for pid, qty in cart.items() if pid not in sharded}
+    if plain:
+        in_stock = reduce(operator.or_, (Q(id=pid, quantity__gte=qty) for pid, qty in plain.items()))
+        decrement = Case(*[When(id=pid, then=Value(qty)) for pid, qty in plain.items()])
+        taken = Product.objects.filter(in_stock).update(quantity=F('quantity') - decrement, updated_at=timezone.now())
+        if taken != len(plain):
+            raise NotEnoughInventoryException()
+    for product_id in sorted(sharded.keys() & cart.keys()):
+        _take_from_shards(product_id, cart[product_id], sharded[product_id])
+    catalog_cache.invalidate_on_commit(cart.keys())
+    events.stock_changed_on_commit(cart.keys())
+
+
+def _take_from_shards(product_id, quantity, shard_count):
+    indexes = list(range(shard_count))
+    random.shuffle(indexes)
+    for index in indexes:
+        if StockShard.objects.filter(product_id=product_id, index=index, quantity__gte=quantity).update(
+                quantity=F('quantity') - quantity):
+            return
+    # No single shard covers the line: lock them all and take across shards
+    shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('index'))
+    if sum(shard.quantity for shard in shards) < quantity:
+        raise NotEnoughInventoryException('Not enough stock for product_id {}'.format(product_id))
+    for shard in shards:
+        taken = min(shard.quantity, quantity)
+        if taken:
+            StockShard.objects.filter(pk=shard.pk).update(quantity=F('quantity') - taken)
+            quantity -= taken
+
+
+def give_back(quantities, sharded=None):
+    """Return ``{product_id: quantity}`` to stock; ``sharded`` is as for ``take``."""
+    sharded = sharded or {}
+    plain = {pid: qty for pid, qty in quantities.items() if pid not in sharded}
+    if plain:
+        increment = Case(*[When(id=pid, then=Value(qty)) for pid, qty in plain.items()])
+        Product.objects.filter(id__in=plain.keys()).update(
+            quantity=F('quantity') + increment, updated_at=timezone.now())
+    for product_id in sorted(sharded.keys() & quantities.keys()):
+        StockShard.objects.filter(product_id=product_id, index=random.randrange(sharded[product_id])).update(
+            quantity=F('quantity') + quantities[product_id])
+    catalog_cache.invalidate_on_commit(quantities.keys())
+    events.stock_changed_on_commit(quantities.keys())
+
+
+def sync_sharded(product_ids=None):
+    """
+    Copy each sharded product's shard total into ``Product.quantity`` where it
+    differs, with one UPDATE. The products whose total moved are invalidated in
+    the catalog cache and announced once the transaction commits; returns how
+    many there were.
+    """
+    queryset = Product.objects.filter(shard_count__gt=0)
+    if product_ids is not None:
+        queryset = queryset.filter(id__in=product_ids)
+    total = StockShard.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id').annotate(
+        total=Sum('quantity')).values('total')
+    changed = list(queryset.annotate(total=Subquery(total)).exclude(quantity=F('total')).values_list(
+        'id', flat=True))
+    if changed:
+        catalog_cache.invalidate_on_commit(changed)
+        events.stock_changed_on_commit(changed)
+        # Only rows that moved, so an idle sweep leaves updated_at and the catalog validators alone
+        Product.objects.filter(id__in=changed).update(quantity=Subquery(total), updated_at=timezone.now())
+    return len(changed)
+
+
+def _spread(product_id, quantity, shard_count):
+    StockShard.objects.filter(product_id=product_id).delete()
+    base, extra = divmod(quantity, shard_count)
+    StockShard.objects.bulk_create([
+        StockShard(product_id_id=product_id, index=index, quantity=base + (1 if index < extra else 0))
+        for index in range(shard_count)
+    ])
+
+
+@transaction.atomic
+def shard(product_id, shard_count):
+    """Spread a product's stock over ``shard_count`` shards, or with 0 fold them back into ``Product.quantity``."""
+    product = Product.objects.select_for_update().get(id=product_id)
+    if product.shard_count:
+        sync_sharded([product_id])
+        product.refresh_from_db(fields=['quantity'])
+    if shard_count:
+        _spread(product_id, product.quantity, shard_count)
+    else:
+        StockShard.objects.filter(product_id=product_id).delete()
+    Product.objects.filter(id=product_id).update(shard_count=shard_count)
+
+
+def stock_set(product_ids):
+    """
+    After staff write a new absolute ``Product.quantity``, make it the shard
+    total again and announce it. The caller invalidates the catalog cache, as
+    it changed more than the stock.
+    """
+    for product_id, quantity, shard_count in Product.objects.filter(
+            id__in=product_ids, shard_count__gt=0).values_list('id', 'quantity', 'shard_count'):
+        _spread(product_id, quantity, shard_count)
+    events.stock_changed_on_commit(product_ids)
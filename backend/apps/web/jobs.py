@@ -0,0 +1,54 @@
+"""Post-checkout side effects, run by the task queue outside the request."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import send_mail
+
+from .models import Order, Product
+from .taskqueue import task
+
+User = get_user_model()
+
+
+def _order_or_none(order_id):
+    # An order deleted in the meantime has nobody left to notify; retrying cannot help
+    return Order.objects.with_details().filter(id=order_id).first()
+
+
+def _lines(order):
+    return '\n'.join('{} x {} at {}'.format(item.quantity, item.product_id.name, item.purchase_price)
+                     for item in order.orderitem_order.all())
+
+
+@task()
+def send_order_confirmation(order_id):
+    order = _order_or_none(order_id)
+    if order is None or not order.user_id.email:
+        return
+    send_mail('Your order #{} has been placed'.format(order.id),
+              'Thank you for your order.\n\n{}\n'.format(_lines(order)),
+              settings.DEFAULT_FROM_EMAIL, [order.user_id.email])
+
+
+@task()
+def send_order_cancellation(order_id):
+    order = _order_or_none(order_id)
+    if order is None or not order.user_id.email:
+        return
+    send_mail('Your order #{} has been canceled'.format(order.id),
+              'The following items were canceled and will not be charged.\n\n{}\n'.format(_lines(order)),
+              settings.DEFAULT_FROM_EMAIL, [order.user_id.email])
+
+
+@task()
+def check_low_stock(order_id):
+    """Tell the staff about products an order left at or below ``LOW_STOCK_THRESHOLD``."""
+    low = list(Product.objects.filter(
+        orderitem_product__order_id=order_id, quantity__lte=settings.LOW_STOCK_THRESHOLD,
+    ).order_by('id').values_list('id', 'name', 'quantity'))
+    recipients = list(User.objects.filter(is_staff=True, is_active=True).exclude(email='')
+                      .values_list('email', flat=True))
+    if not low or not recipients:
+        return
+    send_mail('Low stock: {} product(s)'.format(len(low)),
+              '\n'.join('#{} {}: {} left'.format(*row) for row in low) + '\n',
+              settings.DEFAULT_FROM_EMAIL, recipients)
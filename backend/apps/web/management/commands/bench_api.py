@@ -0,0 +1,77 @@
+import json
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.web import benchsuite
+from apps.web.bench import rebuild_derived, scratch_database, seed
+
+
+class Command(BaseCommand):
+    help = ('Drive every API route with a weighted traffic mix from an in-process client and report '
+            'throughput, p50/p95/p99 latency and queries per request. With --baseline, exit with an '
+            'error when a route regressed, so CI can gate on it.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests in the measured mix.')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per route first.')
+        parser.add_argument('--min-per-route', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the data and the mix.')
+        parser.add_argument('--current-db', action='store_true',
+                            help='Run against the configured database, seeded by seed_bench, instead of a '
+                                 'scratch copy. The mix writes orders, products and users.')
+        parser.add_argument('--users', type=int, default=50, help='Scratch database size.')
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a new baseline.')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare against this baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p50/p95 slowdown against the baseline, as a fraction.')
+        parser.add_argument('--query-tolerance', type=float, default=0.1,
+                            help='Allowed growth in queries per request, as a fraction.')
+        parser.add_argument('--ignore-latency', action='store_true',
+                            help='Only compare query counts, e.g. when CI runs on different hardware.')
+
+    def handle(self, *args, **options):
+        uncovered = benchsuite.route_names() - {s.name for s in benchsuite.SCENARIOS}
+        if uncovered:
+            self.stderr.write('No scenario for: {}'.format(', '.join(sorted(uncovered))))
+
+        with nullcontext() if options['current_db'] else scratch_database():
+            if not options['current_db']:
+                seed(users=options['users'], products=options['products'], orders=options['orders'],
+                     seed_value=options['seed'])
+                rebuild_derived()
+            try:
+                results = benchsuite.run(requests=options['requests'], warmup=options['warmup'],
+                                         min_per_route=options['min_per_route'], seed_value=options['seed'])
+            except ValueError as e:
+                raise CommandError(e)
+
+        self.stdout.write('{:<34} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9} {:>8}'.format(
+            'route', 'reqs', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+        for name, result in sorted(results.items()):
+            self.stdout.write('{:<34} {requests:>6} {errors:>6} {rps:>9.1f} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} '
+                              '{queries:>8.2f}'.format(name, **result))
+        total = sum(result['requests'] for result in results.values())
+        elapsed = sum(result['requests'] / result['rps'] for result in results.values())
+        self.stdout.write('{} requests in {:.1f} s, {:.1f} req/s from one client'.format(total, elapsed, total / elapsed))
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in ('requests', 'seed', 'users', 'products',
+                                                                     'orders', 'current_db')},
+                           'routes': results}, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write('Baseline written to {}'.format(options['save_baseline']))
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = benchsuite.compare(results, baseline, options['tolerance'], options['query_tolerance'],
+                                             latency=not options['ignore_latency'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError('{} regression(s) against {}'.format(len(regressions), options['baseline']))
+            self.stdout.write(self.style.SUCCESS('No regressions against {}'.format(options['baseline'])))
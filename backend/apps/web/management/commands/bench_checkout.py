@@ -0,0 +1,95 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from apps.web import inventory, reservations
+from apps.web.bench import User, scratch_database, summarize
+from apps.web.checkout import place_order
+from apps.web.exceptions import NotEnoughInventoryException
+from apps.web.models import Product
+
+
+def retrying(func, *args):
+    while True:
+        try:
+            return func(*args)
+        except OperationalError:
+            # SQLite reports a competing writer instead of waiting for it
+            time.sleep(0.001)
+
+
+def flash_sale(buy, users, product_id):
+    """Every user tries once to buy one unit; returns (latencies of successful checkouts, sold-out count, elapsed)."""
+    samples, sold_out = [], []
+    start = threading.Barrier(len(users))
+
+    def buyer(user):
+        start.wait()
+        started = time.perf_counter()
+        try:
+            buy(user, [{'product_id': product_id, 'quantity': 1}])
+            samples.append(time.perf_counter() - started)
+        except NotEnoughInventoryException:
+            sold_out.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=buyer, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, sold_out, time.perf_counter() - started
+
+
+def plain_checkout(user, items):
+    return retrying(place_order, user, items)
+
+
+def hold_then_checkout(user, items):
+    held = retrying(reservations.hold, user, items)
+    return retrying(reservations.checkout, user, [reservation.id for reservation in held])
+
+
+class Command(BaseCommand):
+    help = ('Simulate a flash sale: many buyers race for one hot product through plain checkout and through '
+            'reservations, optionally with sharded stock, and report checkouts/sec and latency.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50)
+        parser.add_argument('--stock', type=int, default=25)
+        parser.add_argument('--shards', type=int, default=0, help='Also run each mode with this many stock shards.')
+
+    def handle(self, *args, **options):
+        modes = [('checkout', plain_checkout, 0), ('reserve', hold_then_checkout, 0)]
+        if options['shards']:
+            modes += [(name + '+shards', buy, options['shards']) for name, buy, _ in modes]
+        # Threads cannot share SQLite's in-memory test database without failing on every
+        # table lock, so race on a throwaway file where a writer waits for the other
+        settings_dict = connection.settings_dict
+        if settings_dict['ENGINE'].endswith('sqlite3'):
+            settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench_checkout.sqlite3')
+            settings_dict['OPTIONS'].setdefault('timeout', 30)
+        with scratch_database():
+            users = [User.objects.create_user('buyer{}'.format(i), 'buyer{}@example.com'.format(i), password=None)
+                     for i in range(options['buyers'])]
+            for name, buy, shards in modes:
+                product = Product.objects.create(name=name, description='Flash sale', quantity=options['stock'],
+                                                 wholesale_price=Decimal('5.00'), retail_price=Decimal('9.99'))
+                if shards:
+                    inventory.shard(product.id, shards)
+                samples, sold_out, elapsed = flash_sale(buy, users, product.id)
+                inventory.sync_sharded([product.id])
+                product.refresh_from_db()
+                timings = summarize(samples) if samples else {'p50': 0, 'p99': 0}
+                self.stdout.write(
+                    '{:<16} {:>4} sold  {:>4} sold out  {:>8.1f} checkouts/s  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  '
+                    '{left} left'.format(name, len(samples), len(sold_out), len(samples) / elapsed,
+                                         left=product.quantity, **timings))
+        self.stdout.write('SQLite runs one writer at a time, so the gap between modes is far wider on PostgreSQL.')
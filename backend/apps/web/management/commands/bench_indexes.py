@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from apps.web.bench import scratch_database, seed, summarize, time_callable
+from apps.web.models import Order, OrderItem, Product
+
+
+def hot_queries(user_id):
+    # The query each endpoint issues, keyed by URL name
+    return {
+        'user_orders': lambda: Order.objects.filter(user_id=user_id).order_by('-data_placed', '-id')[:20],
+        'dashboard_orders': lambda: Order.objects.order_by('-data_placed', '-id')[:5],
+        'orders_by_status': lambda: Order.objects.filter(order_status='Processing').order_by('-data_placed')[:20],
+        'recent_top_purchased_items': lambda: OrderItem.objects.filter(order_id__user_id=user_id).exclude(
+            order_id__order_status='Canceled').order_by('-order_id__data_placed', 'id')[:3],
+        'product_list': lambda: Product.objects.filter(quantity__gt=0).order_by('id')[:20],
+    }
+
+
+class Command(BaseCommand):
+    help = ('Seed a scratch database and report EXPLAIN plans and p50/p99 latency of the hot '
+            'query shapes with and without the indexes added in migration 0003.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            self.stdout.write('Seeding: {}'.format(seed(users=options['users'], products=options['products'],
+                                                        orders=options['orders'])))
+            user_id = Order.objects.values_list('user_id', flat=True).first()
+            queries = hot_queries(user_id)
+
+            after = self.measure(queries, options['repeat'])
+            self.drop_indexes()
+            before = self.measure(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, results in (('before', before), ('after', after)):
+                    plan, timings = results[name]
+                    self.stdout.write('  {:<6} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms'.format(label, **timings))
+                    for line in plan.splitlines():
+                        self.stdout.write('           ' + line)
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            plan = build().explain()
+            timings = summarize(time_callable(lambda: list(build()), repeat))
+            results[name] = (plan, timings)
+        return results
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model in (Order, Product):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
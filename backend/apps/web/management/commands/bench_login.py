@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from apps.web.bench import scratch_database, summarize
+from apps.web.views import User
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = ('Measure logins per second on one core for each configured password hasher, to pick '
+            'PASSWORD_HASHER and its costs.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds of logins per hasher.')
+        parser.add_argument('--hasher', action='append', help='Hasher class path (default: every configured one).')
+
+    def handle(self, *args, **options):
+        hashers = options['hasher'] or settings.PASSWORD_HASHERS
+        self.stdout.write('{} cores available; each line is a single thread, so multiply by workers.'.format(
+            os.cpu_count()))
+        with scratch_database():
+            for path in hashers:
+                with override_settings(PASSWORD_HASHERS=[path]):
+                    try:
+                        name = path.rsplit('.', 1)[-1]
+                        user = User.objects.create_user(name, '{}@example.com'.format(name), PASSWORD)
+                    except (ValueError, ImportError) as e:
+                        raise CommandError('{}: {}'.format(path, e))
+                    samples = self.login_loop(user.username, options['duration'])
+                timings = summarize(samples)
+                self.stdout.write('{:<52} {:>8.1f} logins/s  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms'.format(
+                    path, len(samples) / sum(samples), **timings))
+
+    def login_loop(self, username, duration):
+        samples = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if authenticate(username=username, password=PASSWORD) is None:
+                raise CommandError('login failed for {}'.format(username))
+            samples.append(time.perf_counter() - started)
+        return samples
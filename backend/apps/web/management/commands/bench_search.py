@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from apps.web.bench import scratch_database, seed, summarize, time_callable
+from apps.web.models import Product
+from apps.web.search import search_backend
+from apps.web.serializer import ProductSerializer
+from apps.web.views import User
+
+
+class Command(BaseCommand):
+    help = ('Compare /products/search/ against downloading the whole in-stock catalog and '
+            'filtering it client-side, on a seeded scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--query', default='product 12')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed(users=1, products=options['products'], orders=0)
+            search_backend().rebuild()  # seeding bypasses the per-write index sync
+            user = User.objects.get(username='bench0')
+            query = options['query']
+
+            def full_download():
+                # What the frontend did before: fetch everything, then filter in the browser
+                request = Request(RequestFactory().get('/products/'))
+                request.user = user
+                body = JSONRenderer().render(ProductSerializer(
+                    Product.objects.filter(quantity__gt=0), many=True, context={'request': request}).data)
+                words = query.lower().split()
+                matches = [p for p in json.loads(body)
+                           if all(w in (p['name'] + ' ' + p['description']).lower() for w in words)]
+                return len(body), len(matches)
+
+            client = APIClient()
+            client.force_authenticate(user)
+
+            def search():
+                response = client.get('/products/search/', {'q': query})
+                return len(response.content), len(response.data['results'])
+
+            for label, func in (('full list + client filter', full_download), ('search endpoint', search)):
+                size, hits = func()
+                timings = summarize(time_callable(func, options['repeat']))
+                self.stdout.write('{:<28} p50 {p50:9.2f} ms  p99 {p99:9.2f} ms  {size:>10} bytes  {hits} hits'.format(
+                    label, size=size, hits=hits, **timings))
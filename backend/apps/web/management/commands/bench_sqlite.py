@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import override_settings
+
+from apps.web.bench import User, scratch_database, seed, summarize
+from apps.web.checkout import place_order
+from apps.web.models import Order, Product
+
+
+def run_mix(readers, writers, duration):
+    """
+    Readers page through the catalog and the order history while writers place
+    orders, for ``duration`` seconds. Returns the latencies of successful reads
+    and writes and how many attempts failed on a locked database.
+    """
+    product_ids = list(Product.objects.filter(quantity__gt=0).values_list('id', flat=True))
+    user_ids = list(User.objects.values_list('id', flat=True))
+    reads, writes, locked = [], [], []
+    start = threading.Barrier(readers + writers)
+    deadline = []
+
+    def read(rng):
+        offset = rng.randrange(0, max(1, len(product_ids) - 20))
+        list(Product.objects.filter(quantity__gt=0).order_by('id').values('id', 'name', 'retail_price')[
+            offset:offset + 20])
+        list(Order.objects.filter(user_id=rng.choice(user_ids)).order_by('-data_placed', '-id')[:20])
+
+    def write(rng):
+        user = User(id=rng.choice(user_ids))
+        place_order(user, [{'product_id': product_id, 'quantity': 1} for product_id in rng.sample(product_ids, 3)])
+
+    def worker(operation, samples, seed_value):
+        rng = random.Random(seed_value)
+        start.wait()
+        if not deadline:
+            deadline.append(time.perf_counter() + duration)
+        try:
+            while time.perf_counter() < deadline[0]:
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError:
+                    locked.append(1)
+                    continue
+                samples.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(read, reads, i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write, writes, readers + i)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return reads, writes, len(locked)
+
+
+class Command(BaseCommand):
+    help = ('Compare concurrent read and write throughput on SQLite with the default settings and with '
+            'SQLITE_EMBEDDED (WAL, busy_timeout, tuned caches, BEGIN IMMEDIATE checkouts).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode.')
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--orders', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        if not settings_dict['ENGINE'].endswith('sqlite3'):
+            raise CommandError('bench_sqlite needs a SQLite DATABASE_URL.')
+        self.stdout.write('{:<10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+            'mode', 'reads/s', 'read p99', 'writes/s', 'write p99', 'total/s', 'locked'))
+        for mode, embedded in (('default', False), ('embedded', True)):
+            # A file per mode: WAL is a property of the database file and outlives the connection
+            settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench_sqlite.sqlite3')
+            with override_settings(SQLITE_EMBEDDED=embedded), scratch_database():
+                seed(users=50, products=options['products'], orders=options['orders'], out_of_stock_ratio=0)
+                Product.objects.update(quantity=10 ** 6)
+                reads, writes, locked = run_mix(options['readers'], options['writers'], options['duration'])
+            elapsed = options['duration']
+            self.stdout.write('{:<10} {:>10.1f} {:>8.2f}ms {:>10.1f} {:>8.2f}ms {:>10.1f} {:>8}'.format(
+                mode, len(reads) / elapsed, summarize(reads or [0])['p99'], len(writes) / elapsed,
+                summarize(writes or [0])['p99'], (len(reads) + len(writes)) / elapsed, locked))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.web.product_io import FORMATS, format_for, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Upsert products from a CSV or NDJSON feed, streaming it in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--type', choices=FORMATS, help='Feed format; guessed from the file extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['type'] or format_for(options['path'])
+        if fmt is None:
+            raise CommandError('Cannot tell the feed format from the file name, pass --type')
+        with open(options['path'], 'rb') as stream:
+            report = import_products(read_rows(stream, fmt), chunk_size=options['chunk_size'])
+
+        for error in report['errors']:
+            self.stderr.write('row {}: {}'.format(error['row'], dict(error['errors'])))
+        self.stdout.write(self.style.SUCCESS('Imported {} product(s), {} row(s) rejected'.format(
+            report['imported'], len(report['errors']))))
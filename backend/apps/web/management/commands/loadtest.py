@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.web.bench import summarize
+
+
+class HttpConnection:
+    """Just enough HTTP/1.1 keep-alive client for load generation, with no third-party dependency."""
+
+    def __init__(self, host, port, request):
+        self.host, self.port, self.request = host, port, request
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def fetch(self):
+        self.writer.write(self.request)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('server closed the connection')
+        length, keep_alive = 0, True
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip().lower(), value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value == 'close':
+                keep_alive = False
+        await self.reader.readexactly(length)
+        if not keep_alive:
+            self.close()
+        return int(status_line.split()[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_load(base_url, path, token, concurrency, duration):
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    request = ('GET {} HTTP/1.1\r\nHost: {}\r\nAuthorization: Bearer {}\r\nConnection: keep-alive\r\n\r\n'
+               .format(path, parts.netloc, token)).encode('ascii')
+    samples, failures = [], [0]
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        connection = HttpConnection(host, port, request)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if connection.writer is None:
+                    await connection.connect()
+                ok = await connection.fetch() == 200
+            except (OSError, ValueError, asyncio.IncompleteReadError):
+                connection.close()
+                ok = False
+            if ok:
+                samples.append(time.perf_counter() - started)
+            else:
+                failures[0] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, failures[0], time.perf_counter() - started
+
+
+def obtain_token(base_url, username, password):
+    request = urllib.request.Request(base_url.rstrip('/') + '/login/',
+                                     data=json.dumps({'username': username, 'password': password}).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())['access']
+
+
+class Command(BaseCommand):
+    help = ('Drive running servers with many concurrent keep-alive connections and compare requests/sec '
+            'and tail latency, e.g. gunicorn (WSGI) against uvicorn (ASGI).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='LABEL=URL',
+                            help='Server to test, e.g. wsgi=http://127.0.0.1:8000. Repeat to compare.')
+        parser.add_argument('--path', action='append', metavar='PATH',
+                            help='Path to request (default: /products/ and /async/products/). Repeatable.')
+        parser.add_argument('--concurrency', type=int, default=1000)
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds per target and path.')
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+
+    def handle(self, *args, **options):
+        paths = options['path'] or ['/products/', '/async/products/']
+        for target in options['target']:
+            label, _, base_url = target.partition('=')
+            if not base_url:
+                raise CommandError('--target must look like LABEL=URL')
+            token = obtain_token(base_url, options['username'], options['password'])
+            for path in paths:
+                samples, failures, elapsed = asyncio.run(
+                    run_load(base_url, path, token, options['concurrency'], options['duration']))
+                if not samples:
+                    self.stdout.write('{:<8} {:<28} no successful requests ({} failures)'.format(
+                        label, path, failures))
+                    continue
+                timings = summarize(samples)
+                self.stdout.write(
+                    '{:<8} {:<28} {:>9.1f} req/s  p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  p99 {p99:8.2f} ms  '
+                    '{failures} failures'.format(label, path, len(samples) / elapsed, failures=failures, **timings))
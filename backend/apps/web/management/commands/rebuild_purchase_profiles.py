@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.web.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user purchase counts and recent items behind the home-page recommendations.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS('Purchase profiles rebuilt'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.web.sales import find_drift, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProductSalesStats rollup from order history, or check it for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report buckets that disagree with the order history.')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = find_drift()
+            for (product_id, bucket), stored, expected in drift:
+                self.stdout.write('product {} / {}: stored {} expected {}'.format(
+                    product_id, bucket, stored, expected))
+            if drift:
+                raise CommandError('{} sales stats bucket(s) drifted'.format(len(drift)))
+            self.stdout.write(self.style.SUCCESS('Sales stats match order history'))
+            return
+
+        with transaction.atomic():
+            rebuild()
+        self.stdout.write(self.style.SUCCESS('Sales stats rebuilt'))
@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.web import idempotency, inventory, reservations, taskqueue
+from apps.web.bench import summarize
+
+
+def _worker(options):
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent turns Ctrl-C into SIGTERM
+    try:
+        taskqueue.work(burst=options['burst'], batch=options['batch'], poll_interval=options['poll_interval'],
+                       should_stop=lambda: bool(stopping))
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Run background tasks from the database queue in a pool of worker processes. '
+            'Workers finish their current task on SIGTERM/Ctrl-C before exiting.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch', type=int, default=10, help='Tasks claimed per poll.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due.')
+        parser.add_argument('--stats', action='store_true', help='Print per-task counts and timings, then exit.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_stats()
+
+        if options['burst']:
+            self.maintain()
+            processed = taskqueue.work(burst=True, batch=options['batch'])
+            self.stdout.write('Processed {} task(s)'.format(processed))
+            return
+
+        # Children must not inherit the parent's database connection
+        connections.close_all()
+        pool = [multiprocessing.Process(target=_worker, args=(options,), daemon=True)
+                for _ in range(options['processes'])]
+        for process in pool:
+            process.start()
+        self.stdout.write('Started {} worker processes'.format(len(pool)))
+
+        stopping = []
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stopping.append(True))
+        last_purge = last_sweep = 0
+        while any(process.is_alive() for process in pool) and not stopping:
+            now = time.monotonic()
+            if now - last_sweep > settings.RESERVATION_SWEEP_INTERVAL:
+                purge = now - last_purge > 600
+                self.maintain(purge=purge)
+                last_sweep = now
+                if purge:
+                    last_purge = now
+            time.sleep(1)
+        for process in pool:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: finish the current task, then exit
+        for process in pool:
+            process.join()
+
+    def maintain(self, purge=True):
+        released = reservations.release_expired()
+        if released:
+            self.stdout.write('Released {} expired reservation(s)'.format(released))
+        inventory.sync_sharded()
+        if purge:
+            purged = taskqueue.purge()
+            if purged:
+                self.stdout.write('Purged {} finished task(s)'.format(purged))
+            forgotten = idempotency.purge_expired()
+            if forgotten:
+                self.stdout.write('Purged {} expired idempotency key(s)'.format(forgotten))
+
+    def print_stats(self):
+        self.stdout.write('{:<28} {:>7} {:>7} {:>7} {:>7}  {:>12} {:>12} {:>12}'.format(
+            'task', 'queued', 'running', 'done', 'failed', 'wait p50 ms', 'run p50 ms', 'run p95 ms'))
+        for name, entry in sorted(taskqueue.stats().items()):
+            timings = ('{:>12.1f} {:>12.1f} {:>12.1f}'.format(
+                summarize(entry['wait'])['p50'], summarize(entry['run'])['p50'], summarize(entry['run'])['p95'])
+                if entry['run'] else '')
+            self.stdout.write('{:<28} {:>7} {:>7} {:>7} {:>7}  {}'.format(
+                name, *(entry.get(status, 0) for status in ('queued', 'running', 'done', 'failed')), timings))
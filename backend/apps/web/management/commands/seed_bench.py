@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.web.bench import User, rebuild_derived, seed
+
+
+class Command(BaseCommand):
+    help = ('Fill the configured database with synthetic users (bench0, bench1, ...), products, orders and '
+            'watchlists for `manage.py bench_api --current-db`. Meant for throwaway databases only.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--watches-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for repeatable data.')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username='bench0').exists():
+            raise CommandError('This database is already seeded; start from an empty one')
+        with transaction.atomic():
+            counts = seed(users=options['users'], products=options['products'], orders=options['orders'],
+                          items_per_order=options['items_per_order'],
+                          watches_per_user=options['watches_per_user'], seed_value=options['seed'])
+            rebuild_derived()
+        self.stdout.write(self.style.SUCCESS('Seeded {}'.format(
+            ', '.join('{} {}'.format(count, name) for name, count in counts.items()))))
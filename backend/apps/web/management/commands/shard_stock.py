@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.web import inventory
+from apps.web.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Spread a hot product\'s stock over several counter rows so concurrent checkouts stop queueing '
+            'on one row lock. Pass 0 shards to fold the stock back into the product.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('shards', type=int)
+
+    def handle(self, *args, **options):
+        if options['shards'] < 0:
+            raise CommandError('shards must be 0 or more')
+        try:
+            inventory.shard(options['product_id'], options['shards'])
+        except Product.DoesNotExist:
+            raise CommandError('Product {} does not exist'.format(options['product_id']))
+        self.stdout.write(self.style.SUCCESS('Product {} now has {} stock shard(s)'.format(
+            options['product_id'], options['shards'])))
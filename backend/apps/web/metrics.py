@@ -0,0 +1,224 @@
+"""
+Per-endpoint request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times every request. Through ``execute_wrapper`` it
+also times every query the request runs, on each database alias, and it
+files the numbers under the URL name the request resolved to. Serializers
+add the time spent building ``.data`` with ``serializer_timer``. The numbers
+live in process memory: every worker process keeps its own, so scrape each
+one and let Prometheus sum them.
+
+Requests slower than ``SLOW_REQUEST_THRESHOLD`` seconds are logged to
+``apps.web.metrics.slow`` with their SQL. Query parameters and the URL's
+query string are left out: they can hold personal data, and the event
+streams take access tokens as ``?token=``.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+slow_log = logging.getLogger('apps.web.metrics.slow')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = '<unresolved>'  # every 404 shares one label so bad URLs cannot grow the registry
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_current = ContextVar('metrics_recorder', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+        yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+        yield '{}_count{{{}}} {}'.format(name, labels, cumulative)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.query_time = 0
+        self.serializer_time = 0
+        self.responses = {}
+        self.slow = 0
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def record(self, view, method, status, recorder, duration, size, slow):
+        with self.lock:
+            endpoint = self.endpoints.get((view, method))
+            if endpoint is None:
+                endpoint = self.endpoints[(view, method)] = EndpointMetrics()
+            endpoint.duration.observe(duration)
+            endpoint.queries.observe(recorder.queries)
+            if size is not None:
+                endpoint.size.observe(size)
+            endpoint.query_time += recorder.query_time
+            endpoint.serializer_time += recorder.serializer_time
+            endpoint.responses[status] = endpoint.responses.get(status, 0) + 1
+            endpoint.slow += slow
+
+    def render(self):
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+            families = [
+                ('http_request_duration_seconds', 'histogram', 'Time from the first middleware to the response.',
+                 lambda labels, e: e.duration.samples('http_request_duration_seconds', labels)),
+                ('http_responses_total', 'counter', 'Responses by status code.',
+                 lambda labels, e: ('http_responses_total{{{},status="{}"}} {}'.format(labels, code, count)
+                                    for code, count in sorted(e.responses.items()))),
+                ('http_response_size_bytes', 'histogram', 'Body size of non-streaming responses.',
+                 lambda labels, e: e.size.samples('http_response_size_bytes', labels)),
+                ('db_queries_per_request', 'histogram', 'Queries run by one request, on all databases.',
+                 lambda labels, e: e.queries.samples('db_queries_per_request', labels)),
+                ('db_query_duration_seconds_total', 'counter', 'Time spent waiting on queries.',
+                 lambda labels, e: ['db_query_duration_seconds_total{{{}}} {}'.format(labels, e.query_time)]),
+                ('serializer_duration_seconds_total', 'counter', 'Time spent building serializer data.',
+                 lambda labels, e: ['serializer_duration_seconds_total{{{}}} {}'.format(labels, e.serializer_time)]),
+                ('http_slow_requests_total', 'counter', 'Requests over SLOW_REQUEST_THRESHOLD.',
+                 lambda labels, e: ['http_slow_requests_total{{{}}} {}'.format(labels, e.slow)]),
+            ]
+            lines = []
+            for name, kind, help_text, samples in families:
+                lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} {}'.format(name, kind)]
+                for (view, method), endpoint in endpoints:
+                    lines.extend(samples('view="{}",method="{}"'.format(_escape(view), _escape(method)), endpoint))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+class RequestRecorder:
+    """Collects one request's query and serializer timings; installed as an ``execute_wrapper``."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0
+        self.serializer_time = 0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.query_time += elapsed
+            if len(self.statements) < settings.SLOW_REQUEST_MAX_QUERIES:
+                self.statements.append((elapsed, sql))
+
+    def install(self):
+        """Wrap the calling thread's connections; close the returned stack to unwrap them."""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+@contextmanager
+def serializer_timer():
+    """Count the body's time towards the current request's serializer time."""
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.serializer_time += time.perf_counter() - started
+
+
+def finish(request, response, recorder, duration):
+    match = request.resolver_match
+    view = match.view_name if match else UNRESOLVED
+    size = None if response.streaming else len(response.content)
+    threshold = settings.SLOW_REQUEST_THRESHOLD
+    slow = threshold is not None and duration >= threshold
+    registry.record(view, request.method, response.status_code, recorder, duration, size, slow)
+    if slow:
+        slow_log.warning(
+            '%s %s (%s) -> %s in %.1f ms, %d queries in %.1f ms, serializers %.1f ms\n%s',
+            request.method, request.path, view, response.status_code, duration * 1000,
+            recorder.queries, recorder.query_time * 1000, recorder.serializer_time * 1000,
+            '\n'.join('{:10.2f} ms  {}'.format(elapsed * 1000, sql) for elapsed, sql in recorder.statements))
+
+
+class MetricsMiddleware:
+    """Put first in ``MIDDLEWARE`` so the timings cover the whole stack. Works under WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        try:
+            with recorder.install():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finish(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        # Connections belong to threads, so wrap the ones in the thread that runs
+        # this request's sync_to_async calls rather than the event loop's
+        stack = await sync_to_async(recorder.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        finish(request, response, recorder, time.perf_counter() - started)
+        return response
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 00:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_status', models.CharField(max_length=255)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=255)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=255)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_stats_product', to='web.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['order_status', '-units_sold'], name='sales_stats_top_sold')],
+                'unique_together': {('product_id', 'order_status')},
+            },
+        ),
+    ]
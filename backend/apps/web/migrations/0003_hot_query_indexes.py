@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 00:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0002_productsalesstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', 'data_placed'], name='order_user_placed'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_status', 'data_placed'], name='order_status_placed'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['data_placed', 'id'], name='order_placed'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['id'], name='product_in_stock'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+FTS_TABLE = 'web_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE {} USING fts5(name, description, tokenize='porter unicode61')".format(FTS_TABLE))
+        schema_editor.execute(
+            'INSERT INTO {} (rowid, name, description) SELECT id, name, description FROM web_product'.format(FTS_TABLE))
+    elif vendor == 'postgresql':
+        from django.contrib.postgres.indexes import GinIndex
+        from django.contrib.postgres.search import SearchVector
+        Product = apps.get_model('web', 'Product')
+        schema_editor.add_index(Product, GinIndex(SearchVector('name', 'description', config='english'),
+                                                  name='product_search'))
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS {}'.format(FTS_TABLE))
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS product_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        # Vendor specific, so it lives outside the model state; see apps/web/search.py
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 00:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseProfile',
+            fields=[
+                ('user_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='purchase_profile', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recent_items', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductPurchaseCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('times_purchased', models.IntegerField(default=0)),
+                ('product_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchase_counts_product', to='web.product')),
+                ('user_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchase_counts_user', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', '-times_purchased'], name='purchase_count_top')],
+                'unique_together': {('user_id', 'product_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def orders_updated_when_placed(apps, schema_editor):
+    Order = apps.get_model('web', 'Order')
+    Order.objects.update(updated_at=models.F('data_placed'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0008_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(orders_updated_when_placed, migrations.RunPython.noop),
+    ]
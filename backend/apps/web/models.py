@@ -44,6 +44,17 @@ class Product(models.Model):
     quantity = models.IntegerField()
     retail_price = models.DecimalField(max_digits=255, decimal_places=2)
     wholesale_price = models.DecimalField(max_digits=255, decimal_places=2)
+    # Non-zero for hot products whose stock lives in StockShard rows, see apps/web/inventory.py
+    shard_count = models.PositiveSmallIntegerField(default=0)
+    # Moves on every write, queryset updates included; the validators of apps/web/conditional.py
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Customer catalog only ever reads in-stock rows; backends without
+            # partial indexes skip this one
+            models.Index(fields=['id'], condition=models.Q(quantity__gt=0), name='product_in_stock'),
+        ]
 
 
 class WatchList(models.Model):
@@ -59,10 +70,29 @@ class Permission(models.Model):
     user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='permission_user')
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_details(self):
+        # Everything OrderSerializer touches, in three queries regardless of row count
+        return self.select_related('user_id').prefetch_related(
+            models.Prefetch('orderitem_order', queryset=OrderItem.objects.select_related('product_id'))
+        )
+
+
 class Order(models.Model):
     data_placed = models.DateTimeField(auto_now_add=True)
     order_status = models.CharField(max_length=255, blank=True)
     user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='order_user')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'data_placed'], name='order_user_placed'),
+            models.Index(fields=['order_status', 'data_placed'], name='order_status_placed'),
+            # Keyset pagination of the admin dashboard, see apps/web/pagination.py
+            models.Index(fields=['data_placed', 'id'], name='order_placed'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -70,4 +100,98 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     wholesale_price = models.DecimalField(decimal_places=2, max_digits=255)
     order_id = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='orderitem_order')
-    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orderitem_product')
\ No newline at end of file
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='orderitem_product')
+
+
+class ProductSalesStats(models.Model):
+    # Running totals per product and order status, maintained by apps/web/sales.py
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_stats_product')
+    order_status = models.CharField(max_length=255)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=255, decimal_places=2, default=0)
+    profit = models.DecimalField(max_digits=255, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('product_id', 'order_status')
+        indexes = [
+            models.Index(fields=['order_status', '-units_sold'], name='sales_stats_top_sold'),
+        ]
+
+
+class ProductPurchaseCount(models.Model):
+    # Non-canceled order lines per user and product, maintained by apps/web/recommendations.py
+    user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='purchase_counts_user')
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='purchase_counts_product')
+    times_purchased = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user_id', 'product_id')
+        indexes = [
+            models.Index(fields=['user_id', '-times_purchased'], name='purchase_count_top'),
+        ]
+
+
+class PurchaseProfile(models.Model):
+    # Ids of the user's most recent non-canceled OrderItems, newest first, see apps/web/recommendations.py
+    user_id = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='purchase_profile')
+    recent_items = models.JSONField(default=list)
+
+
+class QueuedTask(models.Model):
+    # Durable background job, run by `manage.py runworker`, see apps/web/taskqueue.py
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='queued_task_due'),
+        ]
+
+
+class StockShard(models.Model):
+    # A slice of a hot product's stock; Product.quantity mirrors the sum, see apps/web/inventory.py
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shards')
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product_id', 'index')
+
+
+class StockReservation(models.Model):
+    # Stock taken off the shelf for a user until checkout or expiry, see apps/web/reservations.py
+    user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservation_user')
+    product_id = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservation_product')
+    quantity = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class IdempotencyKey(models.Model):
+    # The stored outcome of a request sent with an Idempotency-Key header, see apps/web/idempotency.py
+    user_id = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while the first request runs
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ('user_id', 'key')
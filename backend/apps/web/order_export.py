@@ -0,0 +1,164 @@
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import OrderItem
+from .product_io import CSV, NDJSON, csv_line
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+PARQUET = 'parquet'
+FORMATS = (CSV, NDJSON, PARQUET)
+CONTENT_TYPES = {CSV: 'text/csv', NDJSON: 'application/x-ndjson', PARQUET: 'application/vnd.apache.parquet'}
+
+ORDER_FIELDS = ['order_id', 'data_placed', 'order_status', 'user_username']
+ITEM_FIELDS = ['item_id', 'product_id', 'product_name', 'quantity', 'purchase_price']
+STAFF_ITEM_FIELDS = ITEM_FIELDS + ['wholesale_price']
+
+_COLUMNS = {
+    'order_id': 'order_id', 'data_placed': 'order_id__data_placed', 'order_status': 'order_id__order_status',
+    'user_username': 'order_id__user_id__username', 'item_id': 'id', 'product_id': 'product_id',
+    'product_name': 'product_id__name', 'quantity': 'quantity', 'purchase_price': 'purchase_price',
+    'wholesale_price': 'wholesale_price',
+}
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a ``placed_from``/``placed_to`` value. A bare date covers the whole day,
+    so ``placed_to=2024-03-31`` includes orders placed on the 31st.
+    """
+    try:
+        # parse_datetime() would also accept a bare date, as midnight
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def order_lines(user, placed_from=None, placed_to=None, order_status=None):
+    """Item-level queryset for the export, ordered so that each order's lines are adjacent."""
+    queryset = OrderItem.objects.all()
+    if not user.is_staff:
+        queryset = queryset.filter(order_id__user_id=user.id)
+    if placed_from is not None:
+        queryset = queryset.filter(order_id__data_placed__gte=placed_from)
+    if placed_to is not None:
+        queryset = queryset.filter(order_id__data_placed__lt=placed_to)
+    if order_status:
+        queryset = queryset.filter(order_id__order_status=order_status)
+    return queryset.order_by('order_id__data_placed', 'order_id', 'id')
+
+
+def _rows(queryset, fields, chunk_size):
+    return queryset.values_list(*[_COLUMNS[f] for f in fields]).iterator(chunk_size=chunk_size)
+
+
+def export_orders(queryset, fmt, staff=False, chunk_size=2000):
+    """
+    Yield the export body chunk by chunk. CSV is one line per order item, NDJSON
+    one object per order with its items nested. Memory use is bounded by
+    ``chunk_size`` whatever the number of matching orders.
+    """
+    item_fields = STAFF_ITEM_FIELDS if staff else ITEM_FIELDS
+    fields = ORDER_FIELDS + item_fields
+    rows = _rows(queryset, fields, chunk_size)
+
+    if fmt == CSV:
+        yield csv_line(fields)
+        for row in rows:
+            yield csv_line(row)
+    elif fmt == NDJSON:
+        yield from _ndjson(rows, item_fields)
+    elif fmt == PARQUET:
+        yield from _parquet(rows, fields, chunk_size)
+    else:
+        raise ValueError(fmt)
+
+
+def _ndjson(rows, item_fields):
+    split = len(ORDER_FIELDS)
+    current = None
+    for row in rows:
+        if current is None or current['order_id'] != row[0]:
+            if current is not None:
+                yield json.dumps(current, default=str) + '\n'
+            current = dict(zip(ORDER_FIELDS, row[:split]))
+            current['data_placed'] = current['data_placed'].isoformat()
+            current['order_items'] = []
+        current['order_items'].append(dict(zip(item_fields, row[split:])))
+    if current is not None:
+        yield json.dumps(current, default=str) + '\n'
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only sink that hands back what was written since the last drain but keeps counting offsets."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def _parquet_schema(fields):
+    types = {
+        'order_id': pyarrow.int64(), 'data_placed': pyarrow.timestamp('us', tz='UTC'),
+        'item_id': pyarrow.int64(), 'product_id': pyarrow.int64(), 'quantity': pyarrow.int64(),
+    }
+    # Prices stay decimal strings: the model allows up to 255 digits
+    return pyarrow.schema([(field, types.get(field, pyarrow.string())) for field in fields])
+
+
+def _parquet(rows, fields, chunk_size):
+    # One row group per chunk, drained from the sink as soon as it is written
+    schema = _parquet_schema(fields)
+    sink = _ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    columns = [[] for _ in fields]
+
+    def flush():
+        writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(values, type=schema.field(i).type) for i, values in enumerate(columns)], schema=schema))
+        for values in columns:
+            values.clear()
+
+    for row in rows:
+        for index, value in enumerate(row):
+            columns[index].append(str(value) if fields[index].endswith('price') else value)
+        if len(columns[0]) >= chunk_size:
+            flush()
+            yield sink.drain()
+    if columns[0]:
+        flush()
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,170 @@
+import base64
+import json
+from datetime import datetime
+from functools import reduce
+import operator
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _encode_key(value):
+    # Full isoformat keeps microseconds, which DjangoJSONEncoder would truncate
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek-method pagination over a unique, composite ordering.
+
+    Each page is fetched with ``WHERE (k1, k2, ...) < (last row)`` and a LIMIT,
+    so page 10,000 costs the same as page 1 and no COUNT(*) is ever issued. The
+    cursor is an opaque token holding the boundary row's key and the direction.
+    """
+    ordering = ('-id',)  # must be unique; the last field is normally the pk
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.finish_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        """
+        The unevaluated query for the requested page. Split out from
+        ``paginate_queryset`` so async views can evaluate it with the async ORM
+        and hand the rows to ``finish_page``.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.keys is not None:
+            self.keys = self.typed_keys(queryset.model, self.keys)
+            queryset = queryset.filter(self._seek(ordering, self.keys))
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.page = rows
+        # Coming back from a later page always means there is a next page, and
+        # moving forward from a cursor always means there is a previous one
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = (self.keys is not None) if not self.reverse else has_more
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def row_keys(self, row):
+        if isinstance(row, dict):  # .values() rows, see apps/web/payloads.py
+            return [row[field.lstrip('-')] for field in self.ordering]
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, row, reverse):
+        payload = json.dumps({'k': self.row_keys(row), 'r': int(reverse)}, default=_encode_key)
+        token = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+            keys, reverse = payload['k'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(keys, list) or len(keys) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return keys, reverse
+
+    def typed_keys(self, model, keys):
+        # The cursor comes from the client: every key must parse as its ordering field
+        typed = []
+        for field, key in zip(self.ordering, keys):
+            try:
+                value = model._meta.get_field(field.lstrip('-')).to_python(key)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None or isinstance(key, (dict, list, bool)) or (
+                    isinstance(value, datetime) and timezone.is_naive(value)):
+                raise NotFound(self.invalid_cursor_message)
+            typed.append(value)
+        return typed
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _seek(ordering, keys):
+        # (a, b, c) "after" (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  ...
+        clauses = []
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = '{}__lt'.format(name) if field.startswith('-') else '{}__gt'.format(name)
+            equal = {ordering[i].lstrip('-'): keys[i] for i in range(position)}
+            clauses.append(Q(**equal) & Q(**{lookup: keys[position]}))
+        return reduce(operator.or_, clauses)
+
+
+class ProductKeysetPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class OrderKeysetPagination(KeysetPagination):
+    ordering = ('-data_placed', '-id')
@@ -0,0 +1,119 @@
+"""
+Read-only payload plans for the hot product and order endpoints.
+
+Building a ``ModelSerializer`` payload means a model instance per row and a
+walk over bound fields per row, and ``ProductSerializer`` then pops the
+staff-only fields again for customers. A plan instead fetches exactly the
+columns one audience sees with ``.values()`` and converts only the few
+values that are not JSON-ready already. The conversions are the serializers'
+own field objects, so a plan renders the same payload as
+``ProductSerializer``/``OrderSerializer``; the snapshot tests hold them to that.
+Plans are compiled once per audience and picked once per request.
+"""
+from functools import lru_cache
+
+from django.db.models import F
+from rest_framework import serializers
+
+from .metrics import serializer_timer
+from .models import OrderItem
+from .serializer import OrderItemSerializer, OrderSerializer, ProductSerializer
+
+
+def _converters(serializer_class, names):
+    # Strings, ints and booleans come out of .values() exactly as the serializer would return them
+    fields = serializer_class().fields
+    return [(name, fields[name].to_representation) for name in names
+            if isinstance(fields[name], (serializers.DecimalField, serializers.DateTimeField))]
+
+
+def _convert(data, converters):
+    for name, convert in converters:
+        value = data[name]
+        if value is not None:
+            data[name] = convert(value)
+    return data
+
+
+class ProductPlan:
+    def __init__(self, staff):
+        self.names = [name for name in ProductSerializer.Meta.fields
+                      if staff or name not in ProductSerializer.STAFF_ONLY_FIELDS]
+        self.converters = _converters(ProductSerializer, self.names)
+
+    def queryset(self, queryset, *extra):
+        # Extra columns stay in the rows but are left out of the payload
+        return queryset.values(*self.names, *extra)
+
+    def render(self, rows):
+        # New dicts, so the rows can still serve as pagination cursors afterwards
+        with serializer_timer():
+            return [_convert({name: row[name] for name in self.names}, self.converters) for row in rows]
+
+
+class OrderPlan:
+    """``OrderSerializer`` with nested items and products, in two queries per page."""
+
+    def __init__(self, staff):
+        self.product = product_plan_for(staff)
+        self.converters = _converters(OrderSerializer, ['data_placed'])
+        self.item_converters = _converters(OrderItemSerializer, ['purchase_price'])
+        self.product_columns = ['product_id' if name == 'id' else 'product_id__' + name
+                                for name in self.product.names]
+
+    def queryset(self, queryset, *extra):
+        return queryset.select_related(None).prefetch_related(None).values(
+            'id', 'data_placed', 'order_status', *extra, user_username=F('user_id__username'))
+
+    def items(self, order_ids):
+        items = {}
+        if not order_ids:
+            return items
+        rows = OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(
+            'order_id', 'id', 'quantity', 'purchase_price', *self.product_columns)
+        for row in rows:
+            items.setdefault(row['order_id'], []).append(row)
+        return items
+
+    def render(self, rows):
+        items = self.items([row['id'] for row in rows])
+        with serializer_timer():
+            return [self._order(row, items.get(row['id'], ())) for row in rows]
+
+    def _order(self, row, items):
+        data = _convert({
+            'id': row['id'],
+            'data_placed': row['data_placed'],
+            'order_status': row['order_status'],
+            'user_username': row['user_username'],
+        }, self.converters)
+        data['order_items'] = [self._item(item) for item in items]
+        return data
+
+    def _item(self, row):
+        product = _convert({name: row[column] for name, column in zip(self.product.names, self.product_columns)},
+                           self.product.converters)
+        return _convert({
+            'id': row['id'],
+            'quantity': row['quantity'],
+            'purchase_price': row['purchase_price'],
+            'product': product,
+        }, self.item_converters)
+
+
+@lru_cache(maxsize=None)
+def product_plan_for(staff):
+    return ProductPlan(staff)
+
+
+@lru_cache(maxsize=None)
+def order_plan_for(staff):
+    return OrderPlan(staff)
+
+
+def product_plan(user):
+    return product_plan_for(bool(user.is_staff))
+
+
+def order_plan(user):
+    return order_plan_for(bool(user.is_staff))
@@ -0,0 +1,141 @@
+import codecs
+import csv
+import io
+import json
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from rest_framework.exceptions import ValidationError
+
+from . import inventory
+from .cache import catalog_cache
+from .models import Product
+from .search import search_backend
+from .serializer import ProductSerializer
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'quantity', 'retail_price', 'wholesale_price']
+UPDATE_FIELDS = ['name', 'description', 'quantity', 'retail_price', 'wholesale_price', 'updated_at']
+CONTENT_TYPES = {CSV: 'text/csv', NDJSON: 'application/x-ndjson'}
+
+
+def format_for(name='', content_type=''):
+    """Guess the feed format from a file name or a content type."""
+    name, content_type = (name or '').lower(), (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return NDJSON
+    if name.endswith('.csv') or 'csv' in content_type:
+        return CSV
+    return None
+
+
+def read_rows(stream, fmt):
+    """
+    Lazily yield ``(row_number, row)`` from a binary stream.
+
+    Only one line is decoded at a time, so a 200k row feed never sits in memory.
+    A row that cannot be parsed is yielded as an ``Exception`` instead of a dict.
+    """
+    lines = codecs.getreader('utf-8-sig')(stream)
+    if fmt == CSV:
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Expected a JSON object')
+
+
+def _split_id(row):
+    raw = row.get('id')
+    if raw in (None, ''):
+        return None
+    return int(raw)
+
+
+def import_products(rows, chunk_size=1000):
+    """
+    Validate ``(row_number, row)`` pairs through ``ProductSerializer`` one chunk
+    at a time and upsert the valid ones by id. Rows without an id are inserted.
+    Returns ``{'imported': n, 'errors': [{'row': n, 'errors': {...}}]}``.
+    """
+    report = {'imported': 0, 'errors': []}
+    # One serializer instance, so the field set is built once rather than per row
+    validator = ProductSerializer()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return report
+
+        products = []
+        for number, row in chunk:
+            if isinstance(row, Exception):
+                report['errors'].append({'row': number, 'errors': {'non_field_errors': [str(row)]}})
+                continue
+            try:
+                product_id = _split_id(row)
+            except (TypeError, ValueError):
+                report['errors'].append({'row': number, 'errors': {'id': ['A valid integer is required.']}})
+                continue
+            try:
+                data = validator.run_validation(row)
+            except ValidationError as exc:
+                report['errors'].append({'row': number, 'errors': exc.detail})
+                continue
+            products.append(Product(id=product_id, **data))
+
+        # A conflict target may only be hit once per statement; the last row for an id wins
+        upserts = list({p.id: p for p in products if p.id is not None}.values())
+        inserts = [p for p in products if p.id is None]
+        with transaction.atomic():
+            if upserts:
+                Product.objects.bulk_create(upserts, update_conflicts=True, unique_fields=['id'],
+                                            update_fields=UPDATE_FIELDS)
+                _reset_id_sequence()
+            if inserts:
+                # A plain insert hands back the new ids, an upsert would not
+                Product.objects.bulk_create(inserts)
+            product_ids = [p.id for p in upserts + inserts if p.id is not None]
+            inventory.stock_set(product_ids)
+            search_backend().update(product_ids)
+            catalog_cache.invalidate_on_commit(product_ids)
+        report['imported'] += len(upserts) + len(inserts)
+
+
+def _reset_id_sequence():
+    # Explicit ids do not advance a Postgres sequence, so the next plain insert would reuse one
+    connection = connections[router.db_for_write(Product)]
+    statements = connection.ops.sequence_reset_sql(no_style(), [Product])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def export_products(fmt, chunk_size=2000):
+    """Yield the whole catalog as CSV or NDJSON text, reading it through a server-side cursor."""
+    rows = Product.objects.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    if fmt == CSV:
+        yield csv_line(EXPORT_FIELDS)
+        for row in rows:
+            yield csv_line(row)
+        return
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str) + '\n'
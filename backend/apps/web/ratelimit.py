@@ -0,0 +1,123 @@
+"""
+Token-bucket rate limiting for the login endpoints.
+
+Every key (a client IP or a username) owns a bucket holding up to ``capacity``
+tokens that refills continuously at ``capacity / period`` tokens per second.
+Each attempt takes one token; an empty bucket rejects the attempt and reports
+how long until the next token arrives. Bursts up to the capacity go through,
+sustained guessing is held to the refill rate.
+
+Buckets live in a pluggable store: ``MemoryBucketStore`` for a single process,
+``RedisBucketStore`` to share limits between workers and hosts.
+"""
+import functools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+
+class MemoryBucketStore:
+    """
+    Buckets in a process-local LRU map. Evicting the least recently used
+    bucket only loses state for a client that has gone quiet, and a bucket
+    idle for a full period has refilled anyway.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now=None):
+        """Take one token from ``key``'s bucket. Returns 0 on success, otherwise the seconds to wait."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            while len(self.buckets) > self.max_entries:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class RedisBucketStore:
+    """
+    Buckets in any server speaking the Redis protocol. The refill-and-take
+    step runs as one Lua script so that concurrent workers cannot both spend
+    the last token; idle buckets expire on their own.
+    """
+    script = """
+        local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+        local wait = 0
+        if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return tostring(wait)
+    """
+
+    def __init__(self, url, prefix='ratelimit:', client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured('LOGIN_RATE_LIMIT_STORE points at Redis but the redis package is not installed')
+            client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.consume_script = client.register_script(self.script)
+
+    def consume(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        return float(self.consume_script(keys=[self.prefix + key], args=[capacity, rate, now]))
+
+
+@functools.lru_cache(maxsize=None)
+def bucket_store():
+    location = settings.LOGIN_RATE_LIMIT_STORE
+    if location.split('://', 1)[0] in ('redis', 'rediss', 'unix'):
+        return RedisBucketStore(location)
+    return MemoryBucketStore()
+
+
+class LoginRateThrottle(BaseThrottle):
+    """Throttle keyed on ``get_key``; limits come from ``LOGIN_RATE_LIMITS[scope]`` as (burst, period)."""
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        key = self.get_key(request)
+        if not key:
+            return True
+        capacity, period = settings.LOGIN_RATE_LIMITS[self.scope]
+        self.retry_after = bucket_store().consume('login:{}:{}'.format(self.scope, key), capacity, capacity / period)
+        return self.retry_after == 0
+
+    def wait(self):
+        return math.ceil(self.retry_after)
+
+
+class LoginIPThrottle(LoginRateThrottle):
+    scope = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginUsernameThrottle(LoginRateThrottle):
+    """Caps guesses against one account however many addresses they come from."""
+    scope = 'username'
+
+    def get_key(self, request):
+        username = request.data.get('username')
+        return username.strip().lower() if isinstance(username, str) else None
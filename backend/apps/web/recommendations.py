@@ -0,0 +1,92 @@
+"""
+Precomputed inputs of the "frequently purchased" and "recently purchased" lists.
+
+``ProductPurchaseCount`` holds how many non-canceled orders of each user
+contained each product; ``PurchaseProfile.recent_items`` is a ring buffer of
+the user's newest non-canceled order lines. Both are updated in the checkout
+and cancellation transactions, so the home-page endpoints read a handful of
+rows by key instead of aggregating the user's whole order history.
+"""
+from collections import Counter
+
+from django.db.models import Case, F, Value, When
+
+from .models import OrderItem, Product, ProductPurchaseCount, PurchaseProfile
+from .sales import CANCELED
+
+RECENT_ITEMS = 3
+TOP_ITEMS = 3
+
+
+def history_recent_items(user_id, limit=RECENT_ITEMS):
+    # The order the recent list has always used: newest order first, then line order
+    return list(OrderItem.objects.filter(order_id__user_id=user_id).exclude(
+        order_id__order_status=CANCELED
+    ).order_by('-order_id__data_placed', 'id').values_list('id', flat=True)[:limit])
+
+
+def _add_counts(user_id, counts, sign=1):
+    if not counts:
+        return
+    ProductPurchaseCount.objects.bulk_create(
+        [ProductPurchaseCount(user_id_id=user_id, product_id_id=product_id) for product_id in counts],
+        ignore_conflicts=True,
+    )
+    delta = Case(*[When(product_id_id=product_id, then=Value(sign * count)) for product_id, count in counts.items()])
+    ProductPurchaseCount.objects.filter(user_id=user_id, product_id__in=counts.keys()).update(
+        times_purchased=F('times_purchased') + delta)
+
+
+def record_order(user_id, items):
+    """Count a freshly placed order's ``OrderItem`` rows. Runs inside the checkout transaction."""
+    _add_counts(user_id, Counter(item.product_id_id for item in items))
+    # Locking the profile serializes concurrent checkouts of one user around the buffer
+    profile, _ = PurchaseProfile.objects.select_for_update().get_or_create(user_id_id=user_id)
+    recent = sorted(item.id for item in items) + profile.recent_items
+    PurchaseProfile.objects.filter(pk=user_id).update(recent_items=recent[:RECENT_ITEMS])
+
+
+def forget_order(order):
+    """Take a canceled order back out of its user's counts and recent items."""
+    lines = list(OrderItem.objects.filter(order_id=order).values_list('id', 'product_id'))
+    _add_counts(order.user_id_id, Counter(product_id for _, product_id in lines), sign=-1)
+    profile = PurchaseProfile.objects.select_for_update().filter(pk=order.user_id_id).first()
+    if profile is not None and set(profile.recent_items) & {item_id for item_id, _ in lines}:
+        # The order's lines leave a gap only the history can refill
+        PurchaseProfile.objects.filter(pk=order.user_id_id).update(
+            recent_items=history_recent_items(order.user_id_id))
+
+
+def frequently_purchased(user_id, limit=TOP_ITEMS):
+    return Product.objects.filter(
+        purchase_counts_product__user_id=user_id,
+        purchase_counts_product__times_purchased__gt=0,
+    ).order_by('-purchase_counts_product__times_purchased', 'id')[:limit]
+
+
+def in_buffer_order(items, ids):
+    position = {item_id: index for index, item_id in enumerate(ids)}
+    return sorted(items, key=lambda item: position[item.id])
+
+
+def recently_purchased(user_id):
+    ids = PurchaseProfile.objects.filter(pk=user_id).values_list('recent_items', flat=True).first() or []
+    return in_buffer_order(OrderItem.objects.select_related('product_id').filter(id__in=ids), ids)
+
+
+def rebuild():
+    """Recompute every user's counts and recent items from the order history."""
+    ProductPurchaseCount.objects.all().delete()
+    PurchaseProfile.objects.all().delete()
+    rows = OrderItem.objects.exclude(order_id__order_status=CANCELED).values_list(
+        'order_id__user_id', 'product_id')
+    ProductPurchaseCount.objects.bulk_create(
+        [ProductPurchaseCount(user_id_id=user_id, product_id_id=product_id, times_purchased=count)
+         for (user_id, product_id), count in Counter(rows.order_by()).items()],
+        batch_size=2000,
+    )
+    user_ids = OrderItem.objects.values_list('order_id__user_id', flat=True).distinct().order_by()
+    PurchaseProfile.objects.bulk_create(
+        [PurchaseProfile(user_id_id=user_id, recent_items=history_recent_items(user_id)) for user_id in user_ids],
+        batch_size=2000,
+    )
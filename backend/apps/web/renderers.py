@@ -0,0 +1,36 @@
+"""
+``JSONRenderer`` backed by orjson, pinned in requirements.txt; without it, the stock renderer.
+
+For strings, integers, booleans, None, lists and dicts the output is byte for
+byte what DRF's ``JSONRenderer`` produces with the default settings: compact
+separators, raw UTF-8 and U+2028/U+2029 escaped. orjson formats floats
+differently, so use it only on views whose payloads carry none; the payload
+plans render decimals as strings.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_default = JSONEncoder().default
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # e.g. integers past 64 bits, which the json module still handles
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+FAST_RENDERER_CLASSES = [FastJSONRenderer] + [
+    renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if not issubclass(renderer, JSONRenderer)]
@@ -0,0 +1,105 @@
+"""
+Time-limited stock holds for flash sales.
+
+Placing an order locks each product row for the whole checkout transaction,
+so buyers of one hot product queue behind each other and most of them learn
+it sold out only at the end. A hold is instead a single conditional decrement
+committed on its own: the product row is locked for one statement, a
+sold-out product answers immediately, and a buyer who got a hold can check
+out without touching the product row again. Holds that are neither checked
+out nor released are returned to stock by ``release_expired`` once
+``RESERVATION_TTL`` passes.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import inventory
+from .checkout import create_order, normalize_cart
+from .exceptions import ReservationExpiredException
+from .models import Product, StockReservation
+from .sqlite import immediate_atomic
+
+
+def hold(user, items):
+    """Take ``items`` off the shelf for ``user``; returns one ``StockReservation`` per product."""
+    cart = normalize_cart(items)
+    if not cart:
+        raise ValidationError({'items': 'The cart is empty.'})
+    expires_at = timezone.now() + timedelta(seconds=settings.RESERVATION_TTL)
+
+    with immediate_atomic():
+        shard_counts = dict(Product.objects.filter(id__in=cart.keys()).values_list('id', 'shard_count'))
+        if len(shard_counts) != len(cart):
+            raise Product.DoesNotExist('Product does not exist')
+        inventory.take(cart, {pid: count for pid, count in shard_counts.items() if count})
+        return StockReservation.objects.bulk_create([
+            StockReservation(user_id_id=user.id, product_id_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in cart.items()
+        ])
+
+
+def checkout(user, reservation_ids):
+    """
+    Turn the user's live holds into an order. The stock is already taken, so no
+    product row is locked. The holds are claimed by deleting them, and if a
+    racing checkout, release or sweep got to any of them first nothing is ordered.
+    """
+    try:
+        reservation_ids = {int(reservation_id) for reservation_id in reservation_ids}
+    except (TypeError, ValueError):
+        raise ValidationError({'reservations': 'Expected a list of reservation ids.'})
+    if not reservation_ids:
+        raise ValidationError({'reservations': 'No reservations given.'})
+
+    with immediate_atomic():
+        held = StockReservation.objects.filter(id__in=reservation_ids, user_id=user.id,
+                                               expires_at__gt=timezone.now())
+        rows = list(held.values_list('product_id', 'quantity'))
+        if len(rows) != len(reservation_ids) or held.delete()[0] != len(rows):
+            raise ReservationExpiredException()
+
+        cart = {}
+        for product_id, quantity in rows:
+            cart[product_id] = cart.get(product_id, 0) + quantity
+        products = list(Product.objects.filter(id__in=cart.keys()).order_by('id'))
+        return create_order(user, products, cart)
+
+
+def _give_back(rows):
+    quantities = {}
+    for product_id, quantity in rows:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    inventory.give_back(quantities, inventory.shard_counts(quantities.keys()))
+
+
+def release(user, reservation_id):
+    """Cancel one of the user's holds early. Returns False if it was already gone."""
+    with immediate_atomic():
+        held = StockReservation.objects.filter(id=reservation_id, user_id=user.id)
+        rows = list(held.values_list('product_id', 'quantity'))
+        if not rows or not held.delete()[0]:
+            return False
+        _give_back(rows)
+    return True
+
+
+def release_expired(now=None, batch_size=500):
+    """Return the stock of every expired hold, a batch per transaction. Returns how many holds were released."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        rows = list(StockReservation.objects.filter(expires_at__lte=now).order_by('id').values_list(
+            'id', 'product_id', 'quantity')[:batch_size])
+        if not rows:
+            return released
+        with immediate_atomic():
+            # Only stock for holds this call actually deleted may go back
+            if StockReservation.objects.filter(id__in=[row[0] for row in rows]).delete()[0] != len(rows):
+                transaction.set_rollback(True)
+                continue
+            _give_back([(product_id, quantity) for _, product_id, quantity in rows])
+        released += len(rows)
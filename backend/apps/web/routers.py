@@ -0,0 +1,52 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go there too unless the code runs
+inside ``replica_reads()`` and ``DATABASE_READ_REPLICA`` names an alias.
+Views opt in with ``ReplicaReadMixin`` when a few seconds of replication lag
+cannot surprise anyone: the catalog listings and the staff analytics. Order
+reads and the watchlist stay on the primary, because a user who has just
+placed an order or watched a product expects to see it on the next page.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Let reads in the body go to the replica; ``enabled=False`` pins them to the primary again."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_READ_REPLICA and _replica_reads.get():
+            return settings.DATABASE_READ_REPLICA
+        return None  # the primary, or wherever a related instance was read from
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # the replica holds the same rows
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # replicas get the schema through replication
+
+
+class ReplicaReadMixin:
+    """Serve the view's GET and HEAD requests from the read replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request.method in SAFE_METHODS):
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,113 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+
+from .models import OrderItem, ProductSalesStats
+
+PROCESSING = 'Processing'
+CANCELED = 'Canceled'
+COMPLETED = 'Completed'
+
+ZERO = Decimal('0.00')
+
+
+def status_bucket(order_status):
+    # The sales reports count every order that is neither processing nor
+    # canceled as sold, so any other status shares the completed bucket
+    if order_status in (PROCESSING, CANCELED):
+        return order_status
+    return COMPLETED
+
+
+def line_totals(lines):
+    """
+    Aggregate ``(product_id, quantity, purchase_price, wholesale_price)`` lines
+    into ``{product_id: [units, revenue, profit]}``.
+    """
+    totals = defaultdict(lambda: [0, ZERO, ZERO])
+    for product_id, quantity, purchase_price, wholesale_price in lines:
+        entry = totals[product_id]
+        entry[0] += quantity
+        entry[1] += quantity * purchase_price
+        entry[2] += quantity * (purchase_price - wholesale_price)
+    return dict(totals)
+
+
+def order_totals(order):
+    return line_totals(OrderItem.objects.filter(order_id=order).values_list(
+        'product_id', 'quantity', 'purchase_price', 'wholesale_price'))
+
+
+def apply_totals(totals, order_status, sign=1):
+    """Add (or with ``sign=-1`` subtract) ``totals`` to one status bucket in two queries."""
+    if not totals:
+        return
+    bucket = status_bucket(order_status)
+    ProductSalesStats.objects.bulk_create(
+        [ProductSalesStats(product_id_id=product_id, order_status=bucket) for product_id in totals],
+        ignore_conflicts=True,
+    )
+
+    def delta(index, output_field):
+        return Case(*[When(product_id_id=product_id, then=Value(sign * values[index]))
+                      for product_id, values in totals.items()], output_field=output_field)
+
+    ProductSalesStats.objects.filter(order_status=bucket, product_id__in=totals.keys()).update(
+        units_sold=F('units_sold') + delta(0, IntegerField()),
+        revenue=F('revenue') + delta(1, DecimalField(max_digits=255, decimal_places=2)),
+        profit=F('profit') + delta(2, DecimalField(max_digits=255, decimal_places=2)),
+    )
+
+
+def move_order(order, old_status, new_status, totals=None):
+    # Moving between statuses that share a bucket is a no-op
+    if status_bucket(old_status) == status_bucket(new_status):
+        return
+    if totals is None:
+        totals = order_totals(order)
+    apply_totals(totals, old_status, sign=-1)
+    apply_totals(totals, new_status)
+
+
+def expected_stats():
+    """Recompute every bucket from the order history; ``{(product_id, bucket): [units, revenue, profit]}``."""
+    rows = OrderItem.objects.values('product_id', 'order_id__order_status').annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('purchase_price')),
+        profit=Sum(F('quantity') * (F('purchase_price') - F('wholesale_price'))),
+    ).order_by()
+    expected = defaultdict(lambda: [0, ZERO, ZERO])
+    for row in rows.iterator():
+        entry = expected[(row['product_id'], status_bucket(row['order_id__order_status']))]
+        entry[0] += row['units']
+        entry[1] += Decimal(row['revenue']).quantize(ZERO)
+        entry[2] += Decimal(row['profit']).quantize(ZERO)
+    return dict(expected)
+
+
+def find_drift():
+    """Return ``(key, stored, expected)`` for every bucket whose stored totals are wrong."""
+    expected = expected_stats()
+    stored = {
+        (row['product_id'], row['order_status']): [row['units_sold'], row['revenue'], row['profit']]
+        for row in ProductSalesStats.objects.values('product_id', 'order_status', 'units_sold', 'revenue', 'profit')
+    }
+    drift = []
+    for key in set(expected) | set(stored):
+        want = expected.get(key, [0, ZERO, ZERO])
+        have = stored.get(key, [0, ZERO, ZERO])
+        if want[0] != have[0] or want[1] != Decimal(have[1]).quantize(ZERO) \
+                or want[2] != Decimal(have[2]).quantize(ZERO):
+            drift.append((key, have, want))
+    return sorted(drift)
+
+
+def rebuild(batch_size=1000):
+    ProductSalesStats.objects.all().delete()
+    ProductSalesStats.objects.bulk_create(
+        (ProductSalesStats(product_id_id=product_id, order_status=bucket, units_sold=units, revenue=revenue,
+                           profit=profit)
+         for (product_id, bucket), (units, revenue, profit) in expected_stats().items()),
+        batch_size=batch_size,
+    )
@@ -0,0 +1,129 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+
+from .models import Product
+
+FTS_TABLE = 'web_product_fts'
+SEARCH_CONFIG = 'english'
+
+
+def terms_for(query):
+    # Only word characters reach the engine, so user input can never be
+    # parsed as FTS syntax (quotes, NEAR, column filters, ...)
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+class SqliteSearchBackend:
+    """FTS5 table holding a copy of name and description, keyed by product id."""
+
+    def search(self, queryset, terms):
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        # A join rather than a correlated subquery, so MATCH is evaluated once
+        # per query instead of once per candidate row. bm25() is negative and
+        # smaller is better; flip it so a higher rank is better on every backend.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=['{0}.rowid = {1}.id'.format(FTS_TABLE, Product._meta.db_table), '{} MATCH %s'.format(FTS_TABLE)],
+            params=[match],
+            select={'rank': '-bm25({})'.format(FTS_TABLE)},
+        )
+
+    def update(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {} WHERE rowid IN ({})'.format(FTS_TABLE, placeholders), product_ids)
+            cursor.execute(
+                'INSERT INTO {} (rowid, name, description) SELECT id, name, description FROM {} WHERE id IN ({})'
+                .format(FTS_TABLE, Product._meta.db_table, placeholders), product_ids)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {}'.format(FTS_TABLE))
+            cursor.execute('INSERT INTO {} (rowid, name, description) SELECT id, name, description FROM {}'
+                           .format(FTS_TABLE, Product._meta.db_table))
+
+
+class PostgresSearchBackend:
+    """
+    Matches against the ``product_search`` GIN expression index. Postgres keeps
+    that index current on every write, so there is nothing to sync.
+    """
+
+    @staticmethod
+    def vector():
+        from django.contrib.postgres.search import SearchVector
+        return SearchVector('name', 'description', config=SEARCH_CONFIG)
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(' & '.join('{}:*'.format(term) for term in terms), config=SEARCH_CONFIG,
+                            search_type='raw')
+        return queryset.annotate(search=self.vector()).filter(search=query).annotate(
+            rank=SearchRank(self.vector(), query))
+
+    def update(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class FallbackSearchBackend:
+    """Unindexed substring match for backends without a full-text engine."""
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+
+    def update(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+BACKENDS = {
+    'sqlite': SqliteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def search_backend():
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+SORTS = {
+    'relevance': ('-rank', 'id'),
+    'price': ('retail_price', 'id'),
+    '-price': ('-retail_price', 'id'),
+    'name': ('name', 'id'),
+    '-name': ('-name', 'id'),
+    'id': ('id',),
+}
+
+
+def search_products(queryset, query='', min_price=None, max_price=None, in_stock=False, sort=None):
+    """
+    Apply the product search filters to ``queryset``. ``sort`` is a key of
+    ``SORTS`` and defaults to relevance when there is a text query.
+    """
+    if in_stock:
+        queryset = queryset.filter(quantity__gt=0)
+    if min_price is not None:
+        queryset = queryset.filter(retail_price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(retail_price__lte=max_price)
+
+    terms = terms_for(query)
+    if terms:
+        queryset = search_backend().search(queryset, terms)
+    sort = sort or ('relevance' if terms else 'id')
+    if sort == 'relevance' and not terms:
+        sort = 'id'
+    return queryset.order_by(*SORTS[sort])
@@ -1,10 +1,28 @@
 from rest_framework import serializers
+from django.utils.functional import cached_property
 from django.contrib.auth import get_user_model
+from .metrics import serializer_timer
 from .models import *
 
 User = get_user_model()
 
 
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    # Reports the time spent building .data to /metrics/; list it in Meta.list_serializer_class
+    # too so many=True is timed as well. Nested serializers are covered by their parent.
+    @property
+    def data(self):
+        with serializer_timer():
+            return super().data
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, style={'input_type': 'password'})
 
@@ -21,48 +39,66 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    STAFF_ONLY_FIELDS = ('wholesale_price', 'quantity')  # also read by the payload plans in payloads.py
+
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'quantity', 'retail_price', 'wholesale_price']
+        list_serializer_class = TimedListSerializer
 
     def get_profit(self, obj):
         return obj.retail_price - obj.wholesale_price
 
+    @cached_property
+    def hide_stock_fields(self):
+        # Looked up once per serializer rather than once per product in a list
+        return not self.context.get('request').user.is_staff
+
     def to_representation(self, instance):
         # Call the superclass method to get the original representation
         ret = super(ProductSerializer, self).to_representation(instance)
         # Conditionally remove fields for non-staff users
-        if not self.context.get('request').user.is_staff:
-            ret.pop('wholesale_price', None)
-            ret.pop('quantity', None)  # Ensure the quantity is not visible to non-staff users
+        if self.hide_stock_fields:
+            for field in self.STAFF_ONLY_FIELDS:
+                ret.pop(field, None)  # Ensure stock and cost are not visible to non-staff users
         return ret
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = ProductSerializer(source='product_id')
 
     class Meta:
         model = OrderItem
         fields = ('id', 'quantity', 'purchase_price', 'product')
+        list_serializer_class = TimedListSerializer
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     order_items = OrderItemSerializer(source='orderitem_order', many=True)
     user_username = serializers.CharField(source='user_id.username')
 
     class Meta:
         model = Order
         fields = ('id', 'data_placed', 'order_status', 'user_username', 'order_items')
+        list_serializer_class = TimedListSerializer
 
 
-class WatchListSerializer(serializers.ModelSerializer):
+class StockReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = StockReservation
+        fields = ('id', 'product_id', 'quantity', 'expires_at')
+        list_serializer_class = TimedListSerializer
+
+
+class WatchListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = WatchList
         fields = ['product_id']
+        list_serializer_class = TimedListSerializer
 
 
-class UpdateOrderStatusSerializer(serializers.ModelSerializer):
+class UpdateOrderStatusSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['order_status']
@@ -75,11 +111,14 @@ class UpdateOrderStatusSerializer(serializers.ModelSerializer):
         return value
 
 
-class TopSoldProductSerializer(serializers.Serializer):
+class TopSoldProductSerializer(TimedSerializerMixin, serializers.Serializer):
     product_id = serializers.IntegerField()
     product_name = serializers.CharField(source='product_id__name')
     total_sold = serializers.IntegerField()
 
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
     def to_representation(self, instance):
         # Custom representation logic if needed
         return super().to_representation(instance)
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""
+SQLite tuning for single-node deployments.
+
+With ``SQLITE_EMBEDDED`` on, every new SQLite connection applies
+``SQLITE_PRAGMAS``. The main one is WAL journaling, where readers keep
+reading the last committed state while a checkout writes, instead of
+waiting for it. The others set how long a writer waits for the lock,
+a cheaper ``synchronous`` level (safe under WAL), and larger page and mmap
+caches.
+
+In the same mode ``immediate_atomic`` takes SQLite's write lock when the
+transaction begins. A plain ``BEGIN`` starts as a reader. When two such
+transactions both try to upgrade to writing, one of them fails at once with
+"database is locked", and ``busy_timeout`` cannot help it. An immediate
+transaction waits for the lock up front instead. Everywhere else it is
+``transaction.atomic``.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+
+def configure_connection(sender, connection, **kwargs):
+    """``connection_created`` receiver, connected in ``WebConfig.ready``."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_EMBEDDED:
+        return
+    # Straight on the driver connection, so they are not logged or counted as request queries
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def _begin_immediate(execute, sql, params, many, context):
+    if sql == 'BEGIN':
+        sql = 'BEGIN IMMEDIATE'
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """``transaction.atomic`` for blocks that will write; nested inside another atomic it is a plain savepoint."""
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block or not settings.SQLITE_EMBEDDED:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # Django opens SQLite transactions with a plain BEGIN through the cursor, so rewrite that one statement
+    with connection.execute_wrapper(_begin_immediate), transaction.atomic(using=using):
+        yield
@@ -0,0 +1,160 @@
+"""
+A durable background task queue kept in the main database, no broker needed.
+
+Functions decorated with ``@task`` can be enqueued as ``QueuedTask`` rows and
+are run by ``manage.py runworker``. Workers claim due rows with a
+compare-and-set UPDATE, so any number of worker processes can share the table
+on SQLite and Postgres alike. A failing task is retried with exponential
+backoff until ``max_attempts``, and a task whose worker died is picked up again
+once ``TASK_VISIBILITY_TIMEOUT`` passes, so tasks must be safe to run twice.
+Each row keeps its timestamps, from which ``stats`` reports queue wait and run
+time per task name.
+"""
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import QueuedTask
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts):
+        self.func, self.name, self.max_attempts = func, name, max_attempts
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, delay=0, **payload):
+        return QueuedTask.objects.create(name=self.name, payload=payload, max_attempts=self.max_attempts,
+                                         run_at=timezone.now() + timedelta(seconds=delay))
+
+    def enqueue_on_commit(self, **payload):
+        # Nothing is queued if the surrounding transaction rolls back, and the
+        # insert stays out of the transaction holding the checkout's row locks
+        transaction.on_commit(lambda: self.enqueue(**payload))
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a background task. Payloads are keyword arguments and must be JSON-serializable."""
+    def register(func):
+        registered = Task(func, name or func.__name__, max_attempts)
+        registry[registered.name] = registered
+        return registered
+    return register
+
+
+def worker_name():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def backoff(attempts):
+    # Exponential, with jitter so tasks that failed together do not retry together
+    delay = min(settings.TASK_RETRY_BACKOFF_MAX, settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(worker, limit=10):
+    """Mark up to ``limit`` due tasks as running for ``worker`` and return them."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASK_VISIBILITY_TIMEOUT)
+    due = QueuedTask.objects.filter(
+        Q(status=QueuedTask.QUEUED, run_at__lte=now) | Q(status=QueuedTask.RUNNING, started_at__lt=stale)
+    ).order_by('run_at', 'id').values_list('id', 'status', 'attempts')[:limit * 2]
+
+    claimed = []
+    for task_id, status, attempts in due:
+        # Another worker that read the same row wins or loses here, never both
+        if QueuedTask.objects.filter(id=task_id, status=status, attempts=attempts).update(
+                status=QueuedTask.RUNNING, attempts=attempts + 1, started_at=now, worker=worker):
+            claimed.append(task_id)
+            if len(claimed) == limit:
+                break
+    return list(QueuedTask.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def execute(queued):
+    """Run one claimed task and record the outcome. Returns the new status."""
+    started = time.perf_counter()
+    try:
+        if queued.attempts > queued.max_attempts:
+            raise RuntimeError('Gave up after the worker running it was lost')
+        registered = registry.get(queued.name)
+        if registered is None:
+            raise LookupError('No task registered as {!r}'.format(queued.name))
+        registered(**queued.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if queued.attempts < queued.max_attempts:
+            fields = {'status': QueuedTask.QUEUED,
+                      'run_at': timezone.now() + timedelta(seconds=backoff(queued.attempts))}
+        else:
+            fields = {'status': QueuedTask.FAILED}
+        logger.warning('Task %s #%s attempt %s failed:\n%s', queued.name, queued.id, queued.attempts, error)
+        fields['last_error'] = error
+    else:
+        fields = {'status': QueuedTask.DONE, 'last_error': ''}
+    elapsed = time.perf_counter() - started
+
+    # Scoped to this attempt, so a run that outlived the visibility timeout cannot
+    # overwrite the state of the retry that replaced it
+    QueuedTask.objects.filter(id=queued.id, attempts=queued.attempts).update(finished_at=timezone.now(), **fields)
+    logger.info('Task %s #%s %s in %.1f ms after waiting %.1f ms', queued.name, queued.id, fields['status'],
+                elapsed * 1000, (queued.started_at - queued.run_at).total_seconds() * 1000)
+    return fields['status']
+
+
+def work(worker=None, burst=False, batch=10, poll_interval=1.0, should_stop=lambda: False):
+    """
+    Claim and run tasks until ``should_stop()`` is true, or with ``burst`` until
+    nothing is due. Returns the number of tasks run.
+    """
+    worker = worker or worker_name()
+    processed = 0
+    while not should_stop():
+        claimed = claim(worker, batch)
+        for queued in claimed:
+            execute(queued)
+            processed += 1
+        if not claimed:
+            if burst:
+                break
+            time.sleep(poll_interval)
+    return processed
+
+
+def purge(older_than=None):
+    """Delete finished tasks older than ``TASK_RESULT_TTL``; failed ones are kept for inspection."""
+    older_than = settings.TASK_RESULT_TTL if older_than is None else older_than
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return QueuedTask.objects.filter(status=QueuedTask.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def stats():
+    """
+    ``{name: {status: count, 'wait': [seconds], 'run': [seconds]}}`` for every
+    task in the table. Wait is the delay between due and started, run is the
+    time of the last attempt.
+    """
+    result = defaultdict(lambda: {'wait': [], 'run': []})
+    rows = QueuedTask.objects.values_list('name', 'status', 'run_at', 'started_at', 'finished_at')
+    for name, status, run_at, started_at, finished_at in rows.iterator(chunk_size=2000):
+        entry = result[name]
+        entry[status] = entry.get(status, 0) + 1
+        if status == QueuedTask.DONE:
+            entry['wait'].append(max(0, (started_at - run_at).total_seconds()))
+            entry['run'].append((finished_at - started_at).total_seconds())
+    return dict(result)
@@ -1,20 +1,34 @@
-from django.db.models import Count, Sum
+from decimal import Decimal, InvalidOperation
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework import generics, permissions, status, views
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model, authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from apps.web.exceptions import *
 from apps.web.serializer import *
 from .models import *
 from django.db import transaction
-from rest_framework.pagination import PageNumberPagination
-from django.db.models import F
+from django.db.models import F, Max
+from .authentication import ShopRefreshToken
 from .permissions import IsAdminUserOrReadOnly
+from .ratelimit import LoginIPThrottle, LoginUsernameThrottle
+from .cache import audience_for, catalog_cache
+from .checkout import change_order_status, place_order
+from .idempotency import idempotent
+from . import conditional, inventory, jobs, metrics, order_export, payloads, recommendations, reservations, watchlist
+from .pagination import OrderKeysetPagination, ProductKeysetPagination
+from .renderers import FAST_RENDERER_CLASSES
+from .routers import ReplicaReadMixin, replica_reads
+from .product_io import CONTENT_TYPES, FORMATS, export_products, format_for, import_products, read_rows
+from .sales import COMPLETED
+from .search import SORTS, search_backend, search_products
 
 User = get_user_model()
 
@@ -27,6 +41,7 @@ class UserRegistrationCreateAPIView(generics.CreateAPIView):
 
 class LoginAPIView(APIView):
     permission_classes = [AllowAny, ]
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
 
     def post(self, request, *args, **kwargs):
         username = request.data.get('username')
@@ -34,7 +49,7 @@ class LoginAPIView(APIView):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             # Generate tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = ShopRefreshToken.for_user(user)
             return Response({
                 'refresh': str(refresh),
                 'access': str(refresh.access_token),
@@ -44,9 +59,28 @@ class LoginAPIView(APIView):
             raise InvalidCredentialsException("Incorrect credentials, please try again.")
 
 
-class UserProductListView(generics.ListAPIView):
+class TokenObtainView(TokenObtainPairView):
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
+
+class PayloadListMixin:
+    """
+    List through a payload plan from payloads.py rather than ``serializer_class``;
+    ``serializer_class`` still describes the payload for the browsable API.
+    """
+    renderer_classes = FAST_RENDERER_CLASSES
+    payload_plan = staticmethod(payloads.product_plan)
+
+    def list(self, request, *args, **kwargs):
+        plan = self.payload_plan(request.user)
+        page = self.paginate_queryset(plan.queryset(self.filter_queryset(self.get_queryset())))
+        return self.get_paginated_response(plan.render(page))
+
+
+class UserProductListView(PayloadListMixin, generics.ListAPIView):
     queryset = Product.objects.filter(quantity__gt=0)
     serializer_class = ProductSerializer
+    pagination_class = ProductKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_serializer_context(self):
@@ -57,12 +91,40 @@ class UserProductListView(generics.ListAPIView):
     def get_queryset(self):
         if self.request.user.is_staff:
             return Product.objects.all()
-        return Product.objects.exclude(quantity=0)
+        return Product.objects.filter(quantity__gt=0)  # matches the product_in_stock partial index
+
+    def list(self, request, *args, **kwargs):
+        url, audience = request.build_absolute_uri(), audience_for(request.user)
+        watched, watched_as_of = watchlist.watched(request.user.id)
+        key = catalog_cache.list_key(url, audience)
+        entry = catalog_cache.get(key)
+        with replica_reads(not catalog_cache.recently_written()):
+            if entry is None:
+                # Every catalog write moves this, so it validates any page. Read it before the
+                # page: a write in between then costs a client one spare 200, never a stale 304
+                catalog_modified = Product.objects.aggregate(last=Max('updated_at'))['last']
+            else:
+                catalog_modified = entry[1]
+
+            def build():
+                if entry is None:
+                    data = super(UserProductListView, self).list(request, *args, **kwargs).data
+                    catalog_cache.set(key, data, catalog_modified)
+                else:
+                    data = entry[0]
+                return Response(dict(data, results=watchlist.mark(data['results'], watched)))
+
+            tag = conditional.etag('products', audience, url, catalog_modified, sorted(watched))
+            # The is_watched flags may change when the user's watched set was reloaded
+            last_modified = max(watched_as_of, catalog_modified or watched_as_of)
+            return conditional.respond(request, tag, last_modified, build,
+                                       conditional.catalog_cache_control(request.user))
 
 
 class UserProductDetail(generics.RetrieveAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get_serializer_context(self):
@@ -74,72 +136,177 @@ class UserProductDetail(generics.RetrieveAPIView):
     def get_queryset(self):
         if self.request.user.is_staff:
             return Product.objects.all()
-        return Product.objects.exclude(quantity=0)
-
+        return Product.objects.filter(quantity__gt=0)
+
+    def retrieve(self, request, *args, **kwargs):
+        product_id, audience = self.kwargs['pk'], audience_for(request.user)
+        key = catalog_cache.product_key(product_id, audience)
+        entry = catalog_cache.get(key)
+        if entry is None:
+            plan = payloads.product_plan(request.user)
+            with replica_reads(not catalog_cache.recently_written()):
+                row = generics.get_object_or_404(plan.queryset(self.get_queryset(), 'updated_at'), pk=product_id)
+            entry = (plan.render([row])[0], row['updated_at'])
+            catalog_cache.set(key, *entry)
+        data, last_modified = entry
+        return conditional.respond(request, conditional.etag('product', audience, product_id, last_modified),
+                                   last_modified, lambda: Response(data),
+                                   conditional.catalog_cache_control(request.user))
+
+
+class SearchPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+class ProductSearchView(ReplicaReadMixin, generics.ListAPIView):
+    """
+    Ranked full-text search over product name and description.
+    Query params: q, min_price, max_price, in_stock, sort (relevance, price, -price, name, -name, id).
+    """
+    serializer_class = ProductSerializer
+    pagination_class = SearchPagination
+    permission_classes = [IsAuthenticated]
 
-class UserOrdersList(generics.ListAPIView):
+    def get_queryset(self):
+        params = self.request.query_params
+        sort = params.get('sort') or None
+        if sort is not None and sort not in SORTS:
+            raise ValidationError({'sort': 'Choose one of {}'.format(', '.join(SORTS))})
+        prices = {}
+        for key in ('min_price', 'max_price'):
+            if params.get(key):
+                try:
+                    prices[key] = Decimal(params[key])
+                except InvalidOperation:
+                    raise ValidationError({key: 'A valid number is required.'})
+        # Customers never see out-of-stock products, staff can opt in to the filter
+        in_stock = not self.request.user.is_staff or params.get('in_stock', '').lower() in ('1', 'true', 'yes')
+        return search_products(Product.objects.all(), params.get('q', ''), in_stock=in_stock, sort=sort, **prices)
+
+
+class UserOrdersList(PayloadListMixin, generics.ListAPIView):
     serializer_class = OrderSerializer  # Define this to include necessary fields
+    payload_plan = staticmethod(payloads.order_plan)
+    pagination_class = OrderKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         if self.request.user.is_staff:
             return Order.objects.all()
-        return Order.objects.filter(user_id=self.request.user)  # .exclude(order_status='Canceled')
+        return Order.objects.filter(user_id=self.request.user.id)  # .exclude(order_status='Canceled')
         # return Order.objects.filter().exclude(order_status='Canceled')
 
 
 class OrderDetail(generics.RetrieveAPIView):
     serializer_class = OrderSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         if self.request.user.is_staff:
             return Order.objects.all()
-        return Order.objects.filter(user_id=self.request.user)
+        return Order.objects.filter(user_id=self.request.user.id)
 
-    def get_object(self):
-        queryset = self.filter_queryset(self.get_queryset())
+    def retrieve(self, request, *args, **kwargs):
+        plan = payloads.order_plan(request.user)
+        # The payload nests the items' products, so their changes count too
+        queryset = plan.queryset(self.filter_queryset(self.get_queryset()), 'updated_at').annotate(
+            products_updated_at=Max('orderitem_order__product_id__updated_at'))
         # Directly use 'pk' from self.kwargs as it matches the URL conf
-        filter_kwargs = {self.lookup_field: self.kwargs.get('pk')}
-        obj = generics.get_object_or_404(queryset, **filter_kwargs)
-        self.check_object_permissions(self.request, obj)
-        return obj
+        row = generics.get_object_or_404(queryset, **{self.lookup_field: self.kwargs.get('pk')})
+        last_modified = max(row['updated_at'], row['products_updated_at'] or row['updated_at'])
+        tag = conditional.etag('order', audience_for(request.user), row['id'], row['updated_at'],
+                               row['products_updated_at'])
+        return conditional.respond(request, tag, last_modified, lambda: Response(plan.render([row])[0]))
 
 
 class PurchaseView(views.APIView):  # create order
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
+    @idempotent
     def post(self, request, *args, **kwargs):
         items = request.data.get('items', [])  # Expected format: [{'product_id': 1, 'quantity': 2}, ...]
-        order = Order.objects.create(user_id=self.request.user, order_status='Processing')
+        reservation_ids = request.data.get('reservations')  # Or ids returned by /reservations/
         try:
-            for item in items:
-                product = Product.objects.get(id=item['product_id'])
-                if item['quantity'] > product.quantity:
-                    raise NotEnoughInventoryException('Not enough stock for product_id {}'.format(item['product_id']))
-                product.quantity -= item['quantity']
-                product.save()
-                OrderItem.objects.create(order_id=order, product_id=product, quantity=item['quantity'],
-                                         purchase_price=product.retail_price, wholesale_price=product.wholesale_price)
+            if reservation_ids is not None:
+                order = reservations.checkout(self.request.user, reservation_ids)
+            else:
+                order = place_order(self.request.user, items)
         except Product.DoesNotExist:
-            order.delete()  # Rollback the order creation if any product does not exist
             return Response({'error': 'Product does not exist'}, status=status.HTTP_400_BAD_REQUEST)
         except NotEnoughInventoryException as e:
-            order.delete()  # Rollback the order creation if not enough inventory
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        jobs.send_order_confirmation.enqueue_on_commit(order_id=order.id)
+        jobs.check_low_stock.enqueue_on_commit(order_id=order.id)
         return Response({'message': 'Order created successfully'}, status=status.HTTP_201_CREATED)
 
 
+class ReservationView(views.APIView):
+    """Hold stock for a few minutes ahead of checkout. Same item format as /purchase/."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            held = reservations.hold(request.user, request.data.get('items', []))
+        except Product.DoesNotExist:
+            return Response({'error': 'Product does not exist'}, status=status.HTTP_400_BAD_REQUEST)
+        except NotEnoughInventoryException as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'reservations': StockReservationSerializer(held, many=True).data,
+                         'expires_at': StockReservationSerializer(held[0]).data['expires_at']},
+                        status=status.HTTP_201_CREATED)
+
+
+class ReleaseReservationView(views.APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, *args, **kwargs):
+        if not reservations.release(request.user, kwargs['pk']):
+            return Response({'error': 'Reservation does not exist'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class OrderExportView(views.APIView):
+    """
+    Stream order history as CSV, NDJSON or Parquet. Staff export every order,
+    customers only their own. Filters: placed_from, placed_to, status.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('type', order_export.CSV)
+        if fmt not in order_export.FORMATS:
+            return Response({'error': 'type must be one of {}'.format(', '.join(order_export.FORMATS))},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if fmt == order_export.PARQUET and order_export.pyarrow is None:
+            return Response({'error': 'Parquet export needs pyarrow installed on the server'},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            bounds = {
+                key: order_export.parse_bound(request.query_params[key], end=(key == 'placed_to'))
+                for key in ('placed_from', 'placed_to') if request.query_params.get(key)
+            }
+        except ValueError as e:
+            return Response({'error': 'Invalid date: {}'.format(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = order_export.order_lines(request.user, order_status=request.query_params.get('status'), **bounds)
+        response = StreamingHttpResponse(order_export.export_orders(queryset, fmt, staff=request.user.is_staff),
+                                         content_type=order_export.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = 'attachment; filename="orders.{}"'.format(fmt)
+        return response
+
+
 class CancelOrderView(views.APIView):
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     @transaction.atomic
     def patch(self, request, *args, **kwargs):
         order_id = kwargs.get('order_id')
         try:
-            order = Order.objects.get(id=order_id)
+            order = Order.objects.select_for_update().get(id=order_id)
             # order = Order.objects.get(id=order_id, user_id_id=request.user.id)
 
             # Check if the request user is the one who placed the order or is a superuser
@@ -153,13 +320,9 @@ class CancelOrderView(views.APIView):
             elif order.order_status.lower() == 'canceled':
                 return Response({'error': 'Order has already been canceled'}, status=status.HTTP_400_BAD_REQUEST)
 
-            order.order_status = 'Canceled'
-            order.save()
-
-            # Increment stock for each item in the order
-            for item in order.orderitem_order.all():
-                item.product_id.quantity += item.quantity
-                item.product_id.save()
+            # Restocks every item in the order
+            change_order_status(order, 'Canceled')
+            jobs.send_order_cancellation.enqueue_on_commit(order_id=order.id)
 
             return Response({'message': 'Order canceled successfully'}, status=status.HTTP_200_OK)
         except Order.DoesNotExist:
@@ -173,6 +336,7 @@ class AddToWatchListView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         serializer.save(user_id=self.request.user)
+        watchlist.watched_changed_on_commit(self.request.user.id)
 
 
 class RemoveFromWatchListView(generics.DestroyAPIView):
@@ -185,27 +349,42 @@ class RemoveFromWatchListView(generics.DestroyAPIView):
         watchlist_item = generics.get_object_or_404(WatchList, user_id=self.request.user, product_id=product_id)
         return watchlist_item
 
+    def perform_destroy(self, instance):
+        instance.delete()
+        watchlist.watched_changed_on_commit(self.request.user.id)
 
-class WatchListView(generics.ListAPIView):
+
+class BulkAddToWatchListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        watchlist.add(request.user.id, watchlist.product_ids_from(request.data))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkRemoveFromWatchListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        removed = watchlist.remove(request.user.id, watchlist.product_ids_from(request.data))
+        return Response({'removed': removed})
+
+
+class WatchListView(PayloadListMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
+    pagination_class = ProductKeysetPagination
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        watchlist_product_ids = WatchList.objects.filter(user_id=self.request.user).values_list('product_id', flat=True)
-        return Product.objects.filter(id__in=watchlist_product_ids, quantity__gt=0)
+        return Product.objects.filter(id__in=watchlist.watched_ids(self.request.user.id), quantity__gt=0)
 
 
 class TopFrequentlyPurchasedItemsList(generics.ListAPIView):
     serializer_class = ProductSerializer
+    permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        return Product.objects.filter(
-            orderitem_product__order_id__user_id=user,
-            orderitem_product__order_id__order_status__in=['Processing', 'Completed']
-        ).annotate(
-            total_purchased=Count('orderitem_product')
-        ).order_by('-total_purchased')[:3]
+        return recommendations.frequently_purchased(self.request.user.id)
 
 
 class TopRecentPurchasedItemsList(generics.ListAPIView):
@@ -213,11 +392,7 @@ class TopRecentPurchasedItemsList(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return OrderItem.objects.filter(
-            order_id__user_id=self.request.user
-        ).exclude(
-            order_id__order_status='Canceled'
-        ).order_by('-order_id__data_placed', 'id')[:3]
+        return recommendations.recently_purchased(self.request.user.id)
 
 
 '''
@@ -225,13 +400,14 @@ Admin: Seller
 '''
 
 
-class SmallSetPagination(PageNumberPagination):
+class SmallSetPagination(OrderKeysetPagination):
     page_size = 5
 
 
-class OrderListView(generics.ListAPIView):
-    queryset = Order.objects.all().order_by('-data_placed')
+class OrderListView(PayloadListMixin, generics.ListAPIView):
+    queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    payload_plan = staticmethod(payloads.order_plan)
     pagination_class = SmallSetPagination
     permission_classes = [IsAdminUser]
 
@@ -245,32 +421,70 @@ class ProductCreateAPIView(generics.CreateAPIView):
     permission_classes = [IsAdminUser]
 
     def perform_create(self, serializer):
-        serializer.save()
+        product = serializer.save()
+        search_backend().update([product.id])
+        catalog_cache.invalidate_on_commit([product.id])
+
+
+class ProductImportView(APIView):
+    """Bulk upsert products from a CSV or NDJSON upload ('file' field) or request body."""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'Upload the feed in a "file" field'}, status=status.HTTP_400_BAD_REQUEST)
+            stream, fmt = upload, format_for(upload.name, upload.content_type)
+        else:
+            stream, fmt = request.stream, format_for(content_type=request.content_type)
+        fmt = request.query_params.get('type', fmt)
+        if fmt not in FORMATS or stream is None:
+            return Response({'error': 'Send text/csv or application/x-ndjson'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+        report = import_products(read_rows(stream, fmt))
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class ProductExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in FORMATS:
+            return Response({'error': 'type must be one of {}'.format(', '.join(FORMATS))},
+                            status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(export_products(fmt), content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = 'attachment; filename="products.{}"'.format(fmt)
+        return response
 
 
 class UpdateOrderStatusView(generics.UpdateAPIView):  # complete the order
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_for_update()
     serializer_class = UpdateOrderStatusSerializer
     permission_classes = [IsAdminUser]
 
+    @idempotent
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        # The row lock taken in get_object() must live until the status is written
+        return super(UpdateOrderStatusView, self).update(request, *args, **kwargs)
+
     def perform_update(self, serializer):
         order = serializer.instance
-        new_status = serializer.validated_data.get('order_status')
+        new_status = serializer.validated_data.get('order_status', order.order_status)
 
         if order.order_status == 'Canceled' and new_status == 'Completed':
             raise ValidationException('Canceled orders cannot be completed.')
         elif order.order_status == 'Completed' and new_status == 'Canceled':
             raise ValidationException('Completed orders cannot be canceled.')
 
-        if new_status == 'Canceled':
-            # Increment product stock
-            for item in order.orderitem_set.all():
-                item.product.quantity += item.quantity
-                item.product.save()
-        serializer.save()
+        # Cancellation restocks the order's items
+        change_order_status(order, new_status)
 
 
-class MostProfitableProductView(generics.ListAPIView):
+class MostProfitableProductView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAdminUser]
 
@@ -278,29 +492,27 @@ class MostProfitableProductView(generics.ListAPIView):
         return Product.objects.annotate(profit=F('retail_price') - F('wholesale_price')).order_by('-profit')[:1]
 
 
-class TopSoldProductsView(generics.ListAPIView):
+class TopSoldProductsView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = TopSoldProductSerializer
     permission_classes = [IsAdminUser]
 
     def get_queryset(self):
-        return OrderItem.objects.exclude(order_id__order_status__in=['Canceled', 'Processing']) \
-                   .values('product_id', 'product_id__name') \
-                   .annotate(total_sold=Sum('quantity')) \
-                   .order_by('-total_sold')[:3]
+        # Served from the rollup, see apps/web/sales.py
+        return ProductSalesStats.objects.filter(order_status=COMPLETED, units_sold__gt=0) \
+                   .values('product_id', 'product_id__name', total_sold=F('units_sold')) \
+                   .order_by('-units_sold')[:3]
 
 
-class TotalItemsSoldView(APIView):
+class TotalItemsSoldView(ReplicaReadMixin, APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, *args, **kwargs):
-        # Aggregate total sold items for each product excluding 'Canceled' or 'Processing' orders
-        total_items_sold_per_product = OrderItem.objects.exclude(
-            order_id__order_status__in=['Canceled', 'Processing']
+        # Total sold items for each product excluding 'Canceled' or 'Processing' orders, from the rollup
+        total_items_sold_per_product = ProductSalesStats.objects.filter(
+            order_status=COMPLETED, units_sold__gt=0
         ).values(
-            'product_id', 'product_id__name'
-        ).annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold')
+            'product_id', 'product_id__name', total_sold=F('units_sold')
+        ).order_by('-units_sold')
 
         return Response({"total_items_sold": list(total_items_sold_per_product)})
 
@@ -315,7 +527,23 @@ class ProductDetailView(generics.RetrieveUpdateAPIView):  # Edit product
             product_instance = self.get_object()
             serializer = self.get_serializer(product_instance, data=request.data)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            self.perform_update(serializer)
             return Response(serializer.data)
         except Product.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+    def perform_update(self, serializer):
+        quantity_before = serializer.instance.quantity
+        product = serializer.save()
+        if product.quantity != quantity_before:
+            inventory.stock_set([product.id])
+        search_backend().update([product.id])
+        catalog_cache.invalidate_on_commit([product.id])
+
+
+class MetricsView(views.APIView):
+    """Per-endpoint latency, query and response size metrics of this process, for Prometheus to scrape."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,107 @@
+"""
+Watchlist membership.
+
+``watched_ids`` returns the set of product ids a user watches. It is cached
+per user in the ``WATCHLIST_CACHE_ALIAS`` cache and dropped whenever the
+user's watchlist changes. The product list uses it to mark ``is_watched``,
+and ``/watchlist/`` to select its products, with one cache read per request
+rather than a query per product or a subquery per page. Every change goes
+through ``watched_changed_on_commit``, which also tells the user's open
+event streams, see ``events.py``.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import events
+from .models import Product, WatchList
+
+MAX_BULK = 500
+
+
+def cache():
+    return caches[settings.WATCHLIST_CACHE_ALIAS]
+
+
+def _cache_key(user_id):
+    return 'watchlist:watched:{}'.format(user_id)
+
+
+def watched(user_id):
+    """``(ids, as_of)``: the watched ids, and a time no earlier than their last change."""
+    entry = cache().get(_cache_key(user_id))
+    if entry is None:
+        ids = frozenset(WatchList.objects.filter(user_id=user_id).values_list('product_id', flat=True))
+        entry = (ids, timezone.now())
+        cache().set(_cache_key(user_id), entry, settings.WATCHLIST_CACHE_TIMEOUT)
+    return entry
+
+
+def watched_ids(user_id):
+    return watched(user_id)[0]
+
+
+async def awatched_ids(user_id):
+    entry = await cache().aget(_cache_key(user_id))
+    if entry is None:
+        ids = frozenset([product_id async for product_id in WatchList.objects.filter(
+            user_id=user_id).values_list('product_id', flat=True)])
+        entry = (ids, timezone.now())
+        await cache().aset(_cache_key(user_id), entry, settings.WATCHLIST_CACHE_TIMEOUT)
+    return entry[0]
+
+
+def watched_changed_on_commit(user_id):
+    # Dropped after commit so a concurrent reader cannot re-cache the old set
+    transaction.on_commit(lambda: cache().delete(_cache_key(user_id)))
+    events.watchlist_changed_on_commit(user_id)
+
+
+def mark_watched(products, user_id):
+    """Copies of the product payloads with ``is_watched`` set; cached payloads are shared, so never edit them."""
+    return mark(products, watched_ids(user_id))
+
+
+async def amark_watched(products, user_id):
+    return mark(products, await awatched_ids(user_id))
+
+
+def mark(products, ids):
+    return [dict(product, is_watched=product['id'] in ids) for product in products]
+
+
+def product_ids_from(data):
+    ids = data.get('product_ids') if hasattr(data, 'get') else None
+    if not isinstance(ids, list) or not ids:
+        raise ValidationError({'product_ids': 'Expected a non-empty list of product ids.'})
+    if len(ids) > MAX_BULK:
+        raise ValidationError({'product_ids': 'At most {} product ids per request.'.format(MAX_BULK)})
+    try:
+        return {int(product_id) for product_id in ids}
+    except (TypeError, ValueError):
+        raise ValidationError({'product_ids': 'Product ids must be integers.'})
+
+
+@transaction.atomic
+def add(user_id, product_ids):
+    """Watch every product in ``product_ids``; ones already watched are left alone. All or nothing."""
+    known = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+    unknown = sorted(product_ids - known)
+    if unknown:
+        raise ValidationError({'product_ids': ['Invalid pk "{}" - object does not exist.'.format(product_id)
+                                               for product_id in unknown]})
+    # The (user_id, product_id) unique constraint turns repeats into no-ops
+    WatchList.objects.bulk_create([WatchList(user_id_id=user_id, product_id_id=product_id)
+                                   for product_id in sorted(known)], ignore_conflicts=True)
+    watched_changed_on_commit(user_id)
+
+
+@transaction.atomic
+def remove(user_id, product_ids):
+    """Stop watching ``product_ids``; returns how many were on the watchlist."""
+    removed = WatchList.objects.filter(user_id=user_id, product_id__in=product_ids).delete()[0]
+    if removed:
+        watched_changed_on_commit(user_id)
+    return removed
@@ -9,10 +9,13 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+import importlib.util
 import os
 from pathlib import Path
 from datetime import timedelta
 
+from config.databases import database_from_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -55,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "apps.web.metrics.MetricsMiddleware",  # first, so its timings cover everything below
     'corsheaders.middleware.CorsMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -90,13 +94,65 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL picks the primary (see config/databases.py for the URL format) and
+# DATABASE_REPLICA_URL an optional read replica. DATABASE_CONN_MAX_AGE overrides how long
+# connections are kept; set DATABASE_POOLER=pgbouncer behind PgBouncer in transaction mode.
+
+def _database(url):
+    max_age = os.environ.get("DATABASE_CONN_MAX_AGE")
+    return database_from_url(url, conn_max_age=int(max_age) if max_age else None,
+                             pooler=os.environ.get("DATABASE_POOLER"))
+
+
 DATABASES = {
+    "default": _database(os.environ.get("DATABASE_URL") or "sqlite:///{}".format(BASE_DIR / "db.sqlite3")),
+}
+# Without a replica the alias points at the primary again, so the routing is always
+# exercised; tests read through it from the primary's test database
+DATABASES["replica"] = dict(
+    _database(os.environ["DATABASE_REPLICA_URL"]) if os.environ.get("DATABASE_REPLICA_URL") else DATABASES["default"],
+    TEST={"MIRROR": "default"},
+)
+
+# Views that tolerate replication lag read from DATABASE_READ_REPLICA, see apps/web/routers.py.
+# Catalog cache misses go to the primary for DATABASE_REPLICA_LAG seconds after a catalog write.
+DATABASE_ROUTERS = ["apps.web.routers.ReplicaRouter"]
+DATABASE_READ_REPLICA = "replica" if os.environ.get("DATABASE_REPLICA_URL") else None
+DATABASE_REPLICA_LAG = int(os.environ.get("DATABASE_REPLICA_LAG", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Serialized catalog payloads, see apps/web/cache.py
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalog",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
 }
 
+if os.environ.get("CATALOG_CACHE_URL"):
+    CACHES["catalog"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CATALOG_CACHE_URL"],
+    }
+
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_CACHE_TIMEOUT = 300
+
+# Cache-Control of customer catalog responses, see apps/web/conditional.py. They vary on
+# Authorization; "public, max-age=60" lets a CDN keep them, one copy per token.
+CATALOG_CACHE_CONTROL = os.environ.get("CATALOG_CACHE_CONTROL", "private, no-cache")
+
+# Per-user watched product id sets, see apps/web/watchlist.py
+WATCHLIST_CACHE_ALIAS = "catalog"
+WATCHLIST_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -117,6 +173,90 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Single-node SQLite deployments: SQLITE_EMBEDDED=1 applies these pragmas to every
+# connection, see apps/web/sqlite.py. cache_size is negative to mean KiB.
+SQLITE_EMBEDDED = os.environ.get("SQLITE_EMBEDDED", "").lower() in ("1", "true", "yes")
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+}
+
+
+# Background tasks, see apps/web/taskqueue.py. Times are in seconds.
+TASK_RETRY_BACKOFF = 5
+TASK_RETRY_BACKOFF_MAX = 3600
+TASK_VISIBILITY_TIMEOUT = 300  # a running task older than this is assumed lost and retried
+TASK_RESULT_TTL = 7 * 24 * 3600
+
+# Stock holds, see apps/web/reservations.py. The worker releases expired holds and
+# refreshes sharded products' quantity every RESERVATION_SWEEP_INTERVAL seconds.
+RESERVATION_TTL = 600
+RESERVATION_SWEEP_INTERVAL = 5
+
+# Idempotency-Key replays, see apps/web/idempotency.py. A duplicate of a request that is
+# still running waits up to IDEMPOTENCY_WAIT for its response, then gets a 409; a request
+# that has held its key for IDEMPOTENCY_LOCK_TIMEOUT without answering is assumed dead.
+IDEMPOTENCY_KEY_TTL = 24 * 3600
+IDEMPOTENCY_WAIT = 5
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_CACHE_ALIAS = "default"
+
+# Stock change events for watchlist subscribers, see apps/web/events.py. The "memory" broker
+# only reaches streams served by the same process; point all processes at one redis:// URL
+# instead. Idle streams get a heartbeat every EVENT_STREAM_KEEPALIVE seconds.
+EVENT_BROKER_URL = os.environ.get("EVENT_BROKER_URL", "memory")
+EVENT_STREAM_KEEPALIVE = 15
+
+# Request metrics, see apps/web/metrics.py. Requests slower than SLOW_REQUEST_THRESHOLD
+# seconds (None disables) are logged with up to SLOW_REQUEST_MAX_QUERIES of their queries.
+SLOW_REQUEST_THRESHOLD = float(os.environ.get("SLOW_REQUEST_THRESHOLD", 0.5))
+SLOW_REQUEST_MAX_QUERIES = 100
+
+EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "shop@localhost")
+LOW_STOCK_THRESHOLD = 5
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+# New passwords use PASSWORD_HASHER (argon2, bcrypt or pbkdf2, default argon2 when
+# argon2-cffi is installed). The other hashers only verify existing hashes, which
+# are upgraded on the user's next successful login, as are hashes with old costs.
+
+_PASSWORD_HASHERS = {
+    "argon2": ("argon2", "apps.web.hashers.TunedArgon2PasswordHasher"),
+    "bcrypt": ("bcrypt", "apps.web.hashers.TunedBCryptSHA256PasswordHasher"),
+    "pbkdf2": (None, "apps.web.hashers.TunedPBKDF2PasswordHasher"),
+}
+_available_hashers = [
+    name for name, (module, _) in _PASSWORD_HASHERS.items() if module is None or importlib.util.find_spec(module)
+]
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", _available_hashers[0])
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER][1]] + [
+    _PASSWORD_HASHERS[name][1] for name in _available_hashers if name != PASSWORD_HASHER
+] + ["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]
+
+# OWASP's minimum argon2id profile: far cheaper per login than Django's default 100 MiB
+PASSWORD_ARGON2_COSTS = {
+    "time_cost": int(os.environ.get("PASSWORD_ARGON2_TIME_COST", 2)),
+    "memory_cost": int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 19456)),
+    "parallelism": int(os.environ.get("PASSWORD_ARGON2_PARALLELISM", 1)),
+}
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 600000))
+
+# Login rate limiting, see apps/web/ratelimit.py. Each entry is (burst, seconds to
+# refill the burst). The store is "memory" or a redis:// URL shared by all workers.
+LOGIN_RATE_LIMITS = {
+    "ip": (20, 60),
+    "username": (5, 60),
+}
+LOGIN_RATE_LIMIT_STORE = os.environ.get("LOGIN_RATE_LIMIT_STORE", "memory")
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -157,11 +297,20 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.web.authentication.StatelessJWTAuthentication",
     ],
+    # Reverse proxies in front of the app. With 0, throttles key on REMOTE_ADDR and ignore
+    # X-Forwarded-For, which the client controls; behind N proxies, trust their last N hops
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
 }
 
 # JWT Token
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
+    "TOKEN_OBTAIN_SERIALIZER": "apps.web.authentication.ShopTokenObtainPairSerializer",
 }
+
+# Read requests trust the is_staff/role claims in the access token. A deactivated user,
+# or one whose is_staff/role changed, is still rejected within this many seconds; None
+# skips the check entirely.
+JWT_ACTIVE_CACHE_TIMEOUT = 60
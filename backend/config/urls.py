@@ -17,29 +17,44 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from apps.web.views import *
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from apps.web import async_views
+from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('', UserRegistrationCreateAPIView.as_view(), name='register'),
-    path('login/token', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/token', TokenObtainView.as_view(), name='token_obtain_pair'),
     path('login/token/refresh', TokenRefreshView.as_view(), name='token_refresh'),
     path('register/', UserRegistrationCreateAPIView.as_view(), name='register'),
     path('login/', LoginAPIView.as_view(), name='login'),
     path('products/', UserProductListView.as_view(), name='product_list'),
     path('products/add/', ProductCreateAPIView.as_view(), name='add_product'),  # admin
+    path('products/search/', ProductSearchView.as_view(), name='product_search'),
     path('products/<int:pk>/', UserProductDetail.as_view(), name='product_detail'), #
     path('orders/', UserOrdersList.as_view(), name='user_orders'),
     path('orders/<int:pk>/', OrderDetail.as_view(), name='order_detail'),
+    path('orders/export/', OrderExportView.as_view(), name='order_export'),
     path('purchase/', PurchaseView.as_view(), name='purchase'),
+    path('reservations/', ReservationView.as_view(), name='reservations'),
+    path('reservations/<int:pk>/', ReleaseReservationView.as_view(), name='release_reservation'),
     path('cancelOrder/<int:order_id>/', CancelOrderView.as_view(), name='cancel'),
     path('watchlist/add/', AddToWatchListView.as_view(), name='add_watchlist'),
     path('watchlist/remove/<int:product_id>/', RemoveFromWatchListView.as_view(), name='remove_watchlist'),
     path('watchlist/', WatchListView.as_view(), name='watchlist'),
+    path('watchlist/bulk/add/', BulkAddToWatchListView.as_view(), name='bulk_add_watchlist'),
+    path('watchlist/bulk/remove/', BulkRemoveFromWatchListView.as_view(), name='bulk_remove_watchlist'),
     path('orders/topFrequentlyPurchased/', TopFrequentlyPurchasedItemsList.as_view(),
          name='top_frequently_purchased'),
     path('orders/recentTopPurchasedItems/', TopRecentPurchasedItemsList.as_view(), name='recent_top_purchased_items'),
 
+    # ASGI-native variants of the hot read paths
+    path('async/products/', async_views.product_list, name='async_product_list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async_product_detail'),
+    path('async/watchlist/', async_views.watchlist, name='async_watchlist'),
+    path('async/orders/recentTopPurchasedItems/', async_views.recent_top_purchased_items,
+         name='async_recent_top_purchased_items'),
+    path('events/stock/', async_views.stock_events, name='stock_events'),  # WebSocket: /ws/stock/, see config/asgi.py
+
     # admin
     path('dashboard/orders/', OrderListView.as_view(), name='dashboard_orders'),
     path('orders/update/<int:pk>/', UpdateOrderStatusView.as_view(), name='update_order_status'),
@@ -47,4 +62,7 @@ urlpatterns = [
     path('products/top-sold/', TopSoldProductsView.as_view(), name='top-sold-products'),
     path('sales/total-items-sold/', TotalItemsSoldView.as_view(), name='total-items-sold'),
     path('products/edit/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+    path('products/import/', ProductImportView.as_view(), name='product_import'),
+    path('products/export/', ProductExportView.as_view(), name='product_export'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),  # admin
 ]